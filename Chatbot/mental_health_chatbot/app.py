@@ -1,34 +1,119 @@
-from flask import Flask, render_template, request, jsonify
-from chatbot import MentalHealthChatbot
+# startup diimpor pertama agar CHATBOT_PROFILE_STARTUP=1 ikut mengukur import berikutnya.
+from startup import STARTUP, configure_logging
 import json
 import os
+import re
+import uuid
+
+with STARTUP.phase("import flask"):
+    from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+with STARTUP.phase("import chatbot"):
+    from chatbot import ConversationContext, MentalHealthChatbot
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+    from page_cache import RenderedPageCache
+    from response_cache import ResponseCache
+    from session_store import SQLiteSessionStore
+
+configure_logging()
+
+SESSION_COOKIE = "auramind_sid"
+# Session id dari klien dibatasi agar tidak bisa dipakai membanjiri store dengan key raksasa.
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
 
 app = Flask(__name__)
-chatbot = MentalHealthChatbot()
+# CHATBOT_SESSION_DB: path SQLite yang dipakai bersama semua worker agar flow terpandu
+# tetap berjalan di belakang load balancer. Tanpa variabel ini sesi hanya ada di memori proses.
+session_db = os.environ.get("CHATBOT_SESSION_DB")
+# CHATBOT_MODEL_MODE: eager | background | lazy | disabled (lihat ml_engine.py).
+# Untuk berbagi bobot antar worker, jalankan `gunicorn --preload` dengan mode eager
+# sehingga model dimuat sekali di proses induk sebelum fork.
+with STARTUP.phase("init chatbot"):
+    chatbot = MentalHealthChatbot(
+        max_sessions=int(os.environ.get("CHATBOT_MAX_SESSIONS", "10000")),
+        session_ttl=float(os.environ.get("CHATBOT_SESSION_TTL", "1800")),
+        model_mode=os.environ.get("CHATBOT_MODEL_MODE", "background"),
+        # CHATBOT_MODEL_BACKEND: pytorch | int8 | onnx (konversi sekali dengan convert_model.py).
+        model_backend=os.environ.get("CHATBOT_MODEL_BACKEND", "pytorch"),
+        # File JSON di data/ dipantau dan dimuat ulang tanpa restart.
+        watch_data=os.environ.get("CHATBOT_WATCH_DATA", "1") == "1",
+        batcher_options={
+            "max_batch_size": int(os.environ.get("CHATBOT_BATCH_SIZE", "8")),
+            "max_wait_ms": float(os.environ.get("CHATBOT_BATCH_WAIT_MS", "10")),
+            "max_queue": int(os.environ.get("CHATBOT_INFERENCE_QUEUE", "64")),
+            "num_threads": int(os.environ.get("CHATBOT_TORCH_THREADS", "0")) or None,
+        },
+        # CHATBOT_RESPONSE_CACHE: path SQLite opsional agar cache balasan model bertahan setelah restart.
+        response_cache=ResponseCache(
+            max_entries=int(os.environ.get("CHATBOT_RESPONSE_CACHE_SIZE", "2048")),
+            persist_path=os.environ.get("CHATBOT_RESPONSE_CACHE"),
+        ),
+        context_backend=SQLiteSessionStore(
+            session_db, ConversationContext, ttl_seconds=float(os.environ.get("CHATBOT_SESSION_TTL", "1800")),
+        ) if session_db else None,
+    )
+
+REGISTRY.gauge("chatbot_sessions", "Jumlah sesi percakapan aktif di backend sesi.", lambda: len(chatbot.sessions))
+REGISTRY.gauge("chatbot_sessions_evicted_total", "Sesi yang dibuang karena batas LRU/TTL.",
+               lambda: chatbot.sessions.evicted_lru + chatbot.sessions.evicted_ttl, kind="counter")
+REGISTRY.gauge("chatbot_inference_queue_depth", "Prompt yang menunggu di antrean inferensi.", chatbot.batcher.queue_depth)
+REGISTRY.gauge("chatbot_model_ready", "1 jika model fallback sudah siap.", lambda: chatbot.model_ready)
+REGISTRY.gauge("chatbot_response_cache_hits_total", "Hit cache balasan model.",
+               lambda: chatbot.response_cache.hits, kind="counter")
+REGISTRY.gauge("chatbot_response_cache_misses_total", "Miss cache balasan model.",
+               lambda: chatbot.response_cache.misses, kind="counter")
+REGISTRY.gauge("chatbot_content_version", "Versi snapshot data JSON yang sedang dipakai.",
+               lambda: chatbot.content.snapshot.version)
+
+def resolve_session_id():
+    """
+    Mengambil session id dari form field atau cookie.
+    Mengembalikan (session_id, is_new); id baru dibuat jika tidak ada yang valid.
+    """
+    session_id = request.form.get("session_id") or request.cookies.get(SESSION_COOKIE)
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id, False
+    return uuid.uuid4().hex, True
 
 def load_structured_topics():
     """
-    IMPROVEMENT: Memuat daftar topik terstruktur dari topics.json untuk UI.
-    Ini menjadi satu-satunya sumber untuk daftar topik di frontend.
+    IMPROVEMENT: Daftar topik terstruktur dari topics.json untuk UI.
+    Ini menjadi satu-satunya sumber untuk daftar topik di frontend; file dimuat
+    dan dipantau oleh content store chatbot sehingga tidak ada I/O per request.
     """
-    try:
-        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
-        with open(os.path.join(data_dir, 'topics.json'), 'r', encoding='utf-8') as f:
-            structured_topics = json.load(f)
-            return structured_topics.get("categories", [])
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"ERROR: Gagal memuat topik dari topics.json: {e}")
-        return []
+    return chatbot.content.snapshot.topic_categories
+
+def render_home_page():
+    return render_template("index.html", hotlines=chatbot.get_hotlines(), topic_categories=load_structured_topics())
+
+def home_page_version():
+    snapshot = chatbot.content.snapshot
+    return snapshot.version, snapshot.last_modified
+
+# Halaman utama dirender sekali per versi data dan disimpan beserta versi gzip-nya.
+home_page = RenderedPageCache(render_home_page, home_page_version)
 
 @app.route("/")
 def home():
     """Menampilkan halaman utama dengan daftar hotline dan topik terstruktur."""
     try:
-        hotlines = chatbot.get_hotlines()
-        # Menggunakan fungsi baru untuk memuat topik
-        topic_categories = load_structured_topics()
-        # Mengirim 'topic_categories' ke template
-        return render_template("index.html", hotlines=hotlines, topic_categories=topic_categories)
+        page = home_page.get()
+        use_gzip = bool(request.accept_encodings["gzip"])
+        # Kedua varian berisi halaman yang sama, jadi ETag mana pun berarti salinan klien masih baru.
+        if request.if_none_match.contains(page.etag) or request.if_none_match.contains(page.gzip_etag) or (
+            not request.if_none_match and request.if_modified_since
+            and request.if_modified_since.timestamp() >= page.last_modified_ts
+        ):
+            resp = Response(status=304)
+        elif use_gzip:
+            resp = Response(page.gzip_body, mimetype="text/html")
+            resp.headers["Content-Encoding"] = "gzip"
+        else:
+            resp = Response(page.body, mimetype="text/html")
+        resp.headers["ETag"] = f'"{page.gzip_etag if use_gzip else page.etag}"'
+        resp.headers["Last-Modified"] = page.last_modified
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp
     except Exception as e:
         print(f"Error in home route: {e}")
         return f"Error: {e}"
@@ -38,16 +123,73 @@ def get_response():
     """Endpoint untuk mendapatkan respons dari chatbot."""
     try:
         user_input = request.form["user_input"]
-        response = chatbot.generate_response(user_input)
-        return jsonify({"response": response})
+        session_id, is_new = resolve_session_id()
+        response = chatbot.generate_response(user_input, session_id=session_id)
+        resp = jsonify({"response": response})
+        if is_new or request.cookies.get(SESSION_COOKIE) != session_id:
+            resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+        return resp
     except Exception as e:
         print(f"Error in get_response: {e}")
         return jsonify({"error": f"Terjadi kesalahan di server: {str(e)}"}), 500
 
+def sse_event(payload, event=None):
+    """Memformat satu event Server-Sent Events."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route("/stream_response", methods=["POST"])
+def stream_response():
+    """
+    Endpoint streaming (SSE). Setiap event `data` berisi potongan teks balasan;
+    event `done` menutup stream dengan balasan lengkap. Jawaban rule-based
+    datang sebagai satu potongan, balasan model per token.
+    """
+    user_input = request.form.get("user_input", "")
+    session_id, is_new = resolve_session_id()
+
+    def generate():
+        chunks = []
+        try:
+            for chunk in chatbot.respond_stream(user_input, session_id=session_id):
+                chunks.append(chunk)
+                yield sse_event({"chunk": chunk})
+            yield sse_event({"response": "".join(chunks)}, event="done")
+        except Exception as e:
+            print(f"Error in stream_response: {e}")
+            yield sse_event({"error": f"Terjadi kesalahan di server: {str(e)}"}, event="error")
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    if is_new or request.cookies.get(SESSION_COOKIE) != session_id:
+        resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return resp
+
+@app.route("/ready")
+def ready():
+    """Status kesiapan untuk load balancer; jawaban rule-based selalu tersedia."""
+    return jsonify({
+        "status": "ok",
+        "model_ready": chatbot.model_ready,
+        "model_state": chatbot.model_loader.state,
+        "model_backend": chatbot.model_loader.backend,
+        "inference": chatbot.batcher.stats(),
+        "response_cache": chatbot.response_cache.stats(),
+        "sessions": chatbot.sessions.stats(),
+    })
+
+@app.route("/metrics")
+def metrics():
+    """Metrik format teks Prometheus: hit dan latensi per tahap, model, antrean, sesi."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+STARTUP.finish()
+
 if __name__ == "__main__":
     if not os.path.exists('templates'):
         print("ERROR: Direktori 'templates' tidak ditemukan.")
     if not os.path.exists('data'):
         print("ERROR: Direktori 'data' tidak ditemukan.")
     
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,182 @@
+"""
+Entry point ASGI untuk AuraMind.
+
+Jalankan dengan server ASGI apa pun, misalnya:
+    uvicorn asgi:app --workers 2
+
+`/get_response` dan `/stream_response` ditangani langsung secara asyncio: tahap
+rule-based dijawab di event loop, sedangkan inferensi model menunggu worker
+inferensi dengan batas waktu per request (CHATBOT_ML_TIMEOUT). Route lain (`/`,
+static, `/ready`, `/metrics`) diteruskan ke aplikasi Flask lewat adaptor WSGI
+`a2wsgi` (thread pool), sehingga kontrak dan template tetap sama persis.
+
+Pesan darurat selalu disaring di event loop sebelum apa pun yang bisa mengantre
+(lock sesi, antrean inferensi, thread pool), sehingga balasannya tetap cepat
+walaupun model sedang penuh.
+"""
+import io
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+
+from werkzeug.formparser import FormDataParser
+from werkzeug.http import parse_options_header
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    raise ImportError("Mode ASGI membutuhkan adaptor WSGI: `pip install a2wsgi`.") from None
+
+from app import app as flask_app, chatbot, sse_event, SESSION_COOKIE, SESSION_ID_PATTERN
+
+logger = logging.getLogger(__name__)
+
+ML_TIMEOUT = float(os.environ.get("CHATBOT_ML_TIMEOUT", "8"))
+MAX_BODY_BYTES = 64 * 1024
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def parse_form(content_type: str, body: bytes) -> Dict[str, str]:
+    """Mem-parse body form urlencoded atau multipart (FormData dari index.html) dengan parser Flask."""
+    mimetype, options = parse_options_header(content_type)
+    parser = FormDataParser(max_form_memory_size=MAX_BODY_BYTES)
+    _, form, _ = parser.parse(io.BytesIO(body), mimetype, len(body), options)
+    return form.to_dict()
+
+
+async def read_body(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("Body request terlalu besar.")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def header_value(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def resolve_session_id(scope, form: Dict[str, str]) -> Tuple[str, bool, bool]:
+    """Sama dengan app.resolve_session_id: (session_id, is_new, needs_cookie)."""
+    cookie = SimpleCookie()
+    cookie.load(header_value(scope, b"cookie"))
+    cookie_sid = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+    session_id = form.get("session_id") or cookie_sid
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id, False, cookie_sid != session_id
+    return uuid.uuid4().hex, True, True
+
+
+async def send_json(send, status: int, payload: Dict, extra_headers: Optional[Headers] = None) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + (extra_headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+def session_cookie_header(session_id: str) -> Tuple[bytes, bytes]:
+    return (b"set-cookie", f"{SESSION_COOKIE}={session_id}; HttpOnly; Path=/; SameSite=Lax".encode("latin-1"))
+
+
+async def get_response(scope, receive, send) -> None:
+    """Endpoint untuk mendapatkan respons dari chatbot (versi asyncio)."""
+    try:
+        form = parse_form(header_value(scope, b"content-type"), await read_body(receive))
+        if "user_input" not in form:
+            raise KeyError("user_input")
+        session_id, _, needs_cookie = resolve_session_id(scope, form)
+        response = await chatbot.generate_response_async(form["user_input"], session_id=session_id,
+                                                         timeout=ML_TIMEOUT)
+        headers = [session_cookie_header(session_id)] if needs_cookie else []
+        await send_json(send, 200, {"response": response}, headers)
+    except Exception as e:
+        print(f"Error in get_response: {e}")
+        await send_json(send, 500, {"error": f"Terjadi kesalahan di server: {str(e)}"})
+
+
+_STREAM_END = object()
+
+
+async def stream_response(scope, receive, send) -> None:
+    """Endpoint streaming (SSE) versi asyncio; format event sama dengan app.stream_response."""
+    form = parse_form(header_value(scope, b"content-type"), await read_body(receive))
+    session_id, _, needs_cookie = resolve_session_id(scope, form)
+    headers = [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+               (b"x-accel-buffering", b"no")]
+    if needs_cookie:
+        headers.append(session_cookie_header(session_id))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    user_input = form.get("user_input", "")
+    emergency = chatbot.screen_emergency(user_input)
+    if emergency is not None:
+        # Jalur prioritas: tidak menunggu thread pool yang mungkin penuh oleh stream model.
+        body = sse_event({"chunk": emergency.response}) + sse_event({"response": emergency.response}, event="done")
+        await send({"type": "http.response.body", "body": body.encode()})
+        return
+
+    # Generator sinkron menunggu token dari model, jadi setiap next() dijalankan di thread pool.
+    loop = asyncio.get_running_loop()
+    chunks = chatbot.respond_stream(user_input, session_id=session_id, screen=False)
+    collected = []
+    try:
+        while (chunk := await loop.run_in_executor(None, next, chunks, _STREAM_END)) is not _STREAM_END:
+            collected.append(chunk)
+            await send({"type": "http.response.body", "body": sse_event({"chunk": chunk}).encode(), "more_body": True})
+        final = sse_event({"response": "".join(collected)}, event="done")
+    except Exception as e:
+        print(f"Error in stream_response: {e}")
+        final = sse_event({"error": f"Terjadi kesalahan di server: {str(e)}"}, event="error")
+    await send({"type": "http.response.body", "body": final.encode()})
+
+
+flask_asgi = WSGIMiddleware(flask_app)
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] != "http":
+        return
+    elif scope["path"] == "/get_response" and scope["method"] == "POST":
+        await get_response(scope, receive, send)
+    elif scope["path"] == "/stream_response" and scope["method"] == "POST":
+        await stream_response(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        print("ERROR: Mode ASGI membutuhkan server ASGI, mis. `pip install uvicorn`.")
+        sys.exit(1)
+    uvicorn.run("asgi:app", host="127.0.0.1", port=int(os.environ.get("PORT", "8000")))
@@ -0,0 +1,223 @@
+"""
+Mode batch/offline untuk memutar ulang transkrip percakapan lewat pipeline chat,
+misalnya untuk audit deteksi darurat dan routing topik.
+
+Contoh:
+    python batch_score.py transkrip.jsonl -o hasil.jsonl
+    python batch_score.py transkrip.jsonl -o hasil.jsonl --workers 8 --seed 1
+    python batch_score.py transkrip.jsonl -o - --model-mode eager --ml-batch-size 8
+    cat transkrip.jsonl | python batch_score.py - -o hasil.jsonl
+
+Format masukan: satu percakapan per baris, misalnya
+    {"id": "c1", "messages": ["halo", "stres", "deadline kantor numpuk"]}
+Elemen `messages` boleh berupa string atau objek dengan field "text"/"content".
+
+Keluaran: satu baris per pesan dengan urutan sama seperti masukan:
+    {"conversation": "c1", "turn": 0, "input": "halo", "stage": "qa",
+     "topic": "sapaan_ramah", "emergency": false, "response": "..."}
+
+Setiap percakapan memakai konteksnya sendiri yang dibuang setelah selesai. File
+dibaca secara streaming dan jumlah percakapan yang sedang diproses dibatasi, jadi
+pemakaian memori tetap walau masukannya sangat besar.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from chatbot import MentalHealthChatbot
+from ml_engine import MODEL_BACKENDS, preload_shared_model
+from startup import configure_logging
+
+# Chatbot milik proses worker, dibuat sekali oleh `_init_worker`.
+_BOT: Optional[MentalHealthChatbot] = None
+_OPTIONS: Dict = {}
+
+
+def _init_worker(options: Dict) -> None:
+    global _BOT, _OPTIONS
+    configure_logging(options["log_level"])
+    _OPTIONS = options
+    _BOT = MentalHealthChatbot(
+        data_dir=options["data_dir"],
+        model_mode=options["model_mode"],
+        model_backend=options["model_backend"],
+        batcher_options={"max_batch_size": options["ml_batch_size"], "max_queue": 1024},
+        ml_timeout=None,
+    )
+
+
+def _messages(conversation: Dict) -> List[str]:
+    messages = []
+    for message in conversation.get("messages", []):
+        if isinstance(message, dict):
+            message = message.get("text", message.get("content", ""))
+        messages.append(str(message))
+    return messages
+
+
+def score_conversation(index: int, conversation: Dict) -> List[Dict]:
+    """Memproses satu percakapan dengan konteks terisolasi di chatbot proses ini."""
+    conversation_id = conversation.get("id", index)
+    session_id = f"batch{index:012d}"
+    rng = None
+    if _OPTIONS.get("seed") is not None:
+        # RNG per percakapan (bukan seed global): hasil tidak bergantung urutan penjadwalan
+        # maupun percakapan lain yang berjalan bersamaan di thread lain (--ml-batch-size).
+        rng = random.Random(_OPTIONS["seed"] * 1_000_003 + index)
+    rows = []
+    try:
+        with _BOT.random_source(rng):
+            for turn, text in enumerate(_messages(conversation)):
+                result = _BOT.respond(text, session_id=session_id)
+                rows.append({
+                    "conversation": conversation_id,
+                    "turn": turn,
+                    "input": text,
+                    "stage": result.stage,
+                    "topic": result.topic,
+                    "emergency": result.emergency,
+                    "response": result.response,
+                })
+    finally:
+        _BOT.sessions.discard(session_id)
+    return rows
+
+
+def score_chunk(chunk: List[Tuple[int, Dict]]) -> List[List[Dict]]:
+    """
+    Satu task pool berisi beberapa percakapan. Dengan --ml-batch-size > 1, percakapan
+    dalam chunk dijalankan bersamaan di thread sehingga fallback model dari percakapan
+    berbeda digabung menjadi satu batch oleh InferenceBatcher.
+    """
+    threads = min(_OPTIONS["ml_batch_size"], len(chunk))
+    if threads <= 1:
+        return [score_conversation(index, conversation) for index, conversation in chunk]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(lambda item: score_conversation(*item), chunk))
+
+
+# (indeks baris, percakapan, pesan error parse atau None)
+Item = Tuple[int, Dict, Optional[str]]
+
+
+def read_conversations(lines: Iterable[str]) -> Iterator[Item]:
+    """Error parse dibawa terpisah agar field "error" milik transkrip tidak disalahartikan."""
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            conversation = json.loads(line)
+            if not isinstance(conversation, dict):
+                raise ValueError("baris harus berupa objek JSON")
+        except ValueError as e:
+            yield index, {"id": index}, f"JSON tidak valid: {e}"
+            continue
+        yield index, conversation, None
+
+
+def _chunks(items: Iterator[Item], size: int) -> Iterator[List[Item]]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(lines: Iterable[str], output: TextIO, workers: int, chunk_size: int,
+              max_in_flight: int, options: Dict) -> Counter:
+    """Menjalankan semua percakapan; hasil ditulis berurutan begitu chunk terdepan selesai."""
+    stats: Counter = Counter()
+    pending: "deque[Tuple[List[Item], Future]]" = deque()
+
+    def write(chunk: List[Item], results: List[List[Dict]]) -> None:
+        for (index, conversation, error), rows in zip(chunk, results):
+            stats["conversations"] += 1
+            if error is not None:
+                stats["errors"] += 1
+                rows = [{"conversation": conversation["id"], "error": error}]
+            for row in rows:
+                if "stage" in row:
+                    stats["messages"] += 1
+                    stats[f"stage:{row['stage']}"] += 1
+                    stats["emergency"] += row["emergency"]
+                output.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        for chunk in _chunks(read_conversations(lines), chunk_size):
+            valid = [(index, conversation) for index, conversation, error in chunk if error is None]
+            pending.append((chunk, pool.submit(score_chunk, valid)))
+            # Batas chunk yang belum ditulis menjaga memori tetap konstan.
+            while len(pending) >= max_in_flight:
+                _write_chunk(pending.popleft(), write)
+        while pending:
+            _write_chunk(pending.popleft(), write)
+    return stats
+
+
+def _write_chunk(entry, write) -> None:
+    chunk, future = entry
+    results = iter(future.result())
+    write(chunk, [[] if error is not None else next(results) for _, _, error in chunk])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Memutar ulang transkrip JSONL lewat pipeline chat AuraMind.")
+    parser.add_argument("input", help="file JSONL percakapan, atau - untuk stdin")
+    parser.add_argument("-o", "--output", default="-", help="file JSONL hasil, atau - untuk stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=16, help="percakapan per task worker")
+    parser.add_argument("--max-in-flight", type=int, default=0,
+                        help="chunk maksimum yang sedang diproses (default: 4 x workers)")
+    parser.add_argument("--data-dir", help="direktori data JSON (default: data/ bawaan)")
+    parser.add_argument("--model-mode", choices=("disabled", "eager"), default="disabled",
+                        help="disabled: audit rule-based saja; eager: fallback model ikut dijalankan")
+    parser.add_argument("--model-backend", choices=MODEL_BACKENDS, default="pytorch")
+    parser.add_argument("--ml-batch-size", type=int, default=1,
+                        help="jalankan sekian percakapan bersamaan per worker agar fallback model di-batch")
+    parser.add_argument("--seed", type=int, help="seed agar pilihan respons acak bisa direproduksi")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    options = {
+        "data_dir": args.data_dir,
+        "model_mode": args.model_mode,
+        "model_backend": args.model_backend,
+        "ml_batch_size": max(1, args.ml_batch_size),
+        "seed": args.seed,
+        "log_level": args.log_level,
+    }
+    if args.model_mode == "eager":
+        # Dimuat sekali di proses induk; worker hasil fork berbagi bobotnya.
+        preload_shared_model(backend=args.model_backend)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        stats = run_batch(source, output, max(1, args.workers), max(1, args.chunk_size),
+                          args.max_in_flight or 4 * max(1, args.workers), options)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    stages = ", ".join(f"{key[6:]}={value}" for key, value in sorted(stats.items()) if key.startswith("stage:"))
+    print(f"{stats['conversations']} percakapan, {stats['messages']} pesan dalam {elapsed:.1f} detik "
+          f"({stats['messages'] / elapsed if elapsed else 0:.0f} pesan/detik); darurat={stats['emergency']}, "
+          f"error={stats['errors']}; {stages}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Benchmark dan load test untuk pipeline chat AuraMind.
+
+Contoh:
+    python benchmark.py                              # in-process, 1 dan 8 thread
+    python benchmark.py --threads 1 4 16 --rounds 50
+    python benchmark.py --http                       # lewat Flask test client
+    python benchmark.py --http --url http://127.0.0.1:5000
+    python benchmark.py --output hasil.json --baseline hasil_lama.json
+    python benchmark.py --scenario emergency      # p99 darurat saat model jenuh
+
+Model BlenderBot diganti model stub dengan latensi yang bisa diatur, sehingga
+benchmark berjalan offline dan hasilnya stabil. Hasil ditulis sebagai JSON;
+dengan --baseline, p99 per tahap dibandingkan dan exit code 1 jika ada regresi.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Model asli tidak pernah dimuat; stub dipasang setelah chatbot dibuat.
+os.environ.setdefault("CHATBOT_MODEL_MODE", "disabled")
+os.environ.setdefault("CHATBOT_WATCH_DATA", "0")
+
+from chatbot import MentalHealthChatbot
+from response_cache import ResponseCache
+from startup import configure_logging
+
+# Input yang diakhiri penanda ini membuat model stub membalas kosong,
+# sehingga pipeline turun ke tahap fallback terakhir.
+EMPTY_REPLY_MARKER = "..."
+
+
+class StubTokenizer:
+    def __call__(self, texts, **kwargs):
+        return {"texts": list(texts)}
+
+    def batch_decode(self, replies, skip_special_tokens=True):
+        return list(replies)
+
+
+class StubModel:
+    """Meniru `generate` BlenderBot: latensi tetap per batch ditambah per prompt."""
+
+    def __init__(self, batch_latency_ms: float = 40.0, per_prompt_ms: float = 5.0):
+        self.batch_latency = batch_latency_ms / 1000.0
+        self.per_prompt = per_prompt_ms / 1000.0
+
+    def generate(self, texts, **kwargs):
+        time.sleep(self.batch_latency + self.per_prompt * len(texts))
+        return ["" if t.endswith(EMPTY_REPLY_MARKER) else f"Aku mendengarmu soal '{t}'." for t in texts]
+
+
+def install_stub_model(bot: MentalHealthChatbot, batch_latency_ms: float, per_prompt_ms: float) -> None:
+    bot.model_loader.use(StubTokenizer(), StubModel(batch_latency_ms, per_prompt_ms))
+    # Korpus yang sama diputar ulang untuk setiap jumlah thread; tanpa cache agar run
+    # berikutnya tetap mengukur jalur model, bukan cache hit dari run sebelumnya.
+    bot.response_cache = ResponseCache(max_entries=0)
+
+
+# Korpus sintetis: setiap percakapan adalah daftar (pesan, tahap yang diharapkan).
+ML_TOPICS = ["film", "masakan", "hujan", "kucing", "liburan", "kopi", "buku", "game", "musik jazz", "pantai"]
+ML_TEMPLATES = [
+    "menurutmu {} itu menarik nggak",
+    "ceritakan dong soal {}",
+    "kemarin aku nonton tentang {}",
+    "aku penasaran sama {}",
+]
+TOPIC_INPUTS = [
+    "aku merasa sangat tertekan akhir akhir ini",
+    "aku cemas terus soal ujian",
+    "rasanya hampa dan kosong",
+    "aku kesal sama temanku",
+    "susah tidur tiap malam",
+    "aku baru patah hati",
+    "aku kesepian di kota baru",
+    "jenuh kerja banget",
+]
+QA_INPUTS = ["halo", "apa kabar", "lagi apa", "iya", "senang sekali hari ini", "hai"]
+# Salah ketik/informal yang hanya tertangkap indeks retrieval.
+RETRIEVAL_INPUTS = ["aku lagi strees banget", "overthingking terus", "apa kabr", "ocd itu apa", "makasiih",
+                    "insomia parah"]
+EMERGENCY_INPUTS = ["aku ingin bunuh diri", "rasanya mau mati saja", "aku sudah tidak tahan lagi"]
+# Ejaan yang disamarkan; hanya tertangkap oleh screener ternormalisasi.
+EMERGENCY_PROBES = EMERGENCY_INPUTS + ["B U N U H  D I R I", "pengen bun0h d1r1 aja", "aku mau bunug diri",
+                                       "rasanya mau matiiii", "thinking about $uicide"]
+FLOW_CONVERSATIONS = [
+    ["stres", "deadline kantor numpuk"],
+    ["overthinking", "aku pasti gagal", "ada bukti dan bantahan"],
+    ["insomnia", "main hp sampai larut"],
+    ["kecemasan", "jantung berdebar"],
+    ["burnout", "kelelahan total"],
+]
+
+
+def build_corpus(rounds: int, seed: int = 7) -> List[List[Tuple[str, str]]]:
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(rounds):
+        flow = rng.choice(FLOW_CONVERSATIONS)
+        conversations.append([(flow[0], "start_flow")] + [(msg, "active_flow") for msg in flow[1:]])
+        conversations.append([(rng.choice(TOPIC_INPUTS), "topic_suggestion")])
+        conversations.append([(rng.choice(QA_INPUTS), "qa")])
+        conversations.append([(rng.choice(RETRIEVAL_INPUTS), "retrieval")])
+        conversations.append([(rng.choice(EMERGENCY_INPUTS), "emergency")])
+        # Nomor unik agar setiap prompt model berbeda dalam satu run.
+        ml_text = rng.choice(ML_TEMPLATES).format(rng.choice(ML_TOPICS)) + f" nomor {i}"
+        conversations.append([(ml_text, "ml")])
+        conversations.append([(f"zzz qwerty {i} {EMPTY_REPLY_MARKER}", "fallback")])
+    rng.shuffle(conversations)
+    return conversations
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: Dict[str, List[float]], wall_seconds: float) -> Dict:
+    stages = {}
+    total = 0
+    for stage, values in sorted(samples.items()):
+        values = sorted(values)
+        total += len(values)
+        stages[stage] = {
+            "count": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000 if values else 0.0,
+        }
+    return {
+        "messages": total,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": total / wall_seconds if wall_seconds else 0.0,
+        "stages": stages,
+    }
+
+
+def run_load(send: Callable[[str, str], str], conversations: List[List[Tuple[str, str]]],
+             threads: int) -> Dict:
+    """Menjalankan semua percakapan; `send(pesan, session_id)` mengembalikan nama tahap."""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    mismatches = 0
+    lock = threading.Lock()
+
+    def run_conversation(index: int) -> None:
+        nonlocal mismatches
+        session_id = f"bench{index:08d}"
+        for message, expected in conversations[index]:
+            started = time.perf_counter()
+            stage = send(message, session_id) or expected
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[stage].append(elapsed)
+                mismatches += stage != expected
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run_conversation, range(len(conversations))))
+    result = summarize(samples, time.perf_counter() - started)
+    result["threads"] = threads
+    result["stage_mismatches"] = mismatches
+    return result
+
+
+def run_emergency_under_load(bot: MentalHealthChatbot, load_threads: int, probes: int,
+                             fast_path: bool) -> Dict:
+    """
+    Membanjiri fallback model dari `load_threads` sesi sekaligus, lalu mengirim pesan
+    darurat ke sesi-sesi yang sama dan mengukur latensinya. Sesi tidak dipegang selama
+    inferensi, jadi tanpa jalur cepat probe hanya membayar checkout sesi dan tahap
+    rule-based di tengah beban; dengan backend in-memory selisih keduanya kecil.
+    """
+    bot.emergency_fast_path = fast_path
+    samples: Dict[str, List[float]] = defaultdict(list)
+    mismatches = 0
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def flood(index: int) -> None:
+        session_id = f"load{index:06d}"
+        sent = 0
+        while not stop.is_set():
+            message = f"ceritakan dong soal {ML_TOPICS[index % len(ML_TOPICS)]} nomor {index}-{sent}"
+            started = time.perf_counter()
+            stage = bot.respond(message, session_id=session_id).stage
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[stage].append(elapsed)
+            sent += 1
+
+    workers = [threading.Thread(target=flood, args=(i,), daemon=True) for i in range(load_threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.3)  # biarkan antrean inferensi terisi dulu
+
+    rng = random.Random(11)
+    started_wall = time.perf_counter()
+    for i in range(probes):
+        started = time.perf_counter()
+        stage = bot.respond(rng.choice(EMERGENCY_PROBES), session_id=f"load{i % load_threads:06d}").stage
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples[stage].append(elapsed)
+            mismatches += stage != "emergency"
+        time.sleep(0.005)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    result = summarize(samples, time.perf_counter() - started_wall)
+    result["mode"] = "emergency-fast-path" if fast_path else "emergency-in-session"
+    result["threads"] = load_threads
+    result["stage_mismatches"] = mismatches
+    result["inference"] = bot.batcher.stats()
+    return result
+
+
+def in_process_sender(bot: MentalHealthChatbot) -> Callable[[str, str], str]:
+    def send(message: str, session_id: str) -> str:
+        return bot.respond(message, session_id=session_id).stage
+    return send
+
+
+def flask_sender() -> Tuple[Callable[[str, str], Optional[str]], MentalHealthChatbot]:
+    import app as app_module
+    client_local = threading.local()
+
+    def send(message: str, session_id: str) -> Optional[str]:
+        client = getattr(client_local, "client", None)
+        if client is None:
+            client = client_local.client = app_module.app.test_client()
+        resp = client.post("/get_response", data={"user_input": message, "session_id": session_id})
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        return None  # Tahap tidak terlihat dari luar; pakai label korpus.
+    return send, app_module.chatbot
+
+
+def url_sender(base_url: str) -> Callable[[str, str], Optional[str]]:
+    endpoint = base_url.rstrip("/") + "/get_response"
+
+    def send(message: str, session_id: str) -> Optional[str]:
+        body = urllib.parse.urlencode({"user_input": message, "session_id": session_id}).encode()
+        with urllib.request.urlopen(endpoint, data=body, timeout=60) as resp:
+            resp.read()
+        return None
+    return send
+
+
+def find_regressions(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    base_runs = {(run["mode"], run["threads"]): run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        base_run = base_runs.get((run["mode"], run["threads"]))
+        if base_run is None:
+            continue
+        for stage, stats in run["stages"].items():
+            base = base_run["stages"].get(stage)
+            if base and base["p99_ms"] > 0 and stats["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{run['mode']}/{run['threads']} thread/{stage}: p99 {stats['p99_ms']:.2f} ms "
+                    f"> baseline {base['p99_ms']:.2f} ms"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline chat AuraMind.")
+    parser.add_argument("--scenario", choices=("corpus", "emergency"), default="corpus",
+                        help="corpus: korpus campuran; emergency: pesan darurat saat fallback model jenuh")
+    parser.add_argument("--rounds", type=int, default=30, help="jumlah putaran korpus (7 percakapan per putaran)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--http", action="store_true", help="uji lewat endpoint /get_response")
+    parser.add_argument("--url", help="URL server yang sedang berjalan (default: Flask test client)")
+    parser.add_argument("--model-latency-ms", type=float, default=40.0, help="latensi stub per batch")
+    parser.add_argument("--model-per-prompt-ms", type=float, default=5.0, help="latensi stub per prompt")
+    parser.add_argument("--output", help="tulis hasil JSON ke file (default: stdout)")
+    parser.add_argument("--baseline", help="file JSON hasil sebelumnya untuk deteksi regresi")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="toleransi kenaikan p99 (0.25 = 25%%)")
+    parser.add_argument("--load-threads", type=int, default=32, help="skenario emergency: sesi yang membanjiri model")
+    parser.add_argument("--probes", type=int, default=200, help="skenario emergency: jumlah pesan darurat")
+    parser.add_argument("--emergency-p99-ms", type=float, default=25.0,
+                        help="skenario emergency: batas p99 balasan darurat lewat jalur cepat")
+    args = parser.parse_args(argv)
+    if args.scenario == "emergency":
+        return run_emergency_scenario(args)
+
+    conversations = build_corpus(args.rounds)
+    if args.url:
+        mode, send, bot = "http-url", url_sender(args.url), None
+    elif args.http:
+        mode = "http-test-client"
+        send, bot = flask_sender()
+    else:
+        mode = "in-process"
+        bot = MentalHealthChatbot(model_mode="disabled")
+        send = in_process_sender(bot)
+    if bot is not None:
+        install_stub_model(bot, args.model_latency_ms, args.model_per_prompt_ms)
+
+    runs = []
+    for threads in args.threads:
+        run = run_load(send, conversations, threads)
+        run["mode"] = mode
+        if bot is not None:
+            run["inference"] = bot.batcher.stats()
+        runs.append(run)
+        print(f"[{mode}] {threads} thread: {run['throughput_rps']:.1f} pesan/detik", file=sys.stderr)
+
+    result = {
+        "benchmark": "chat_pipeline",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "rounds": args.rounds,
+        "model_stub": {"batch_latency_ms": args.model_latency_ms, "per_prompt_ms": args.model_per_prompt_ms},
+        "runs": runs,
+    }
+    return write_result(result, args)
+
+
+def run_emergency_scenario(args) -> int:
+    """
+    Mengukur p99 balasan darurat saat fallback model jenuh, dengan jalur cepat
+    (sebelum sesi dimuat) dan tanpa jalur cepat (lewat checkout sesi dan tahap
+    rule-based biasa). Exit code 1 jika p99 jalur cepat melebihi --emergency-p99-ms.
+    """
+    if args.http or args.url:
+        print("Skenario emergency hanya berjalan in-process.", file=sys.stderr)
+        return 2
+    bot = MentalHealthChatbot(model_mode="disabled", batcher_options={"max_queue": 4 * args.load_threads})
+    install_stub_model(bot, args.model_latency_ms, args.model_per_prompt_ms)
+
+    runs = []
+    for fast_path in (False, True):
+        run = run_emergency_under_load(bot, args.load_threads, args.probes, fast_path)
+        runs.append(run)
+        emergency = run["stages"].get("emergency", {})
+        print(f"[{run['mode']}] darurat p99 {emergency.get('p99_ms', 0):.2f} ms, "
+              f"model p99 {run['stages'].get('ml', {}).get('p99_ms', 0):.0f} ms", file=sys.stderr)
+
+    result = {
+        "benchmark": "emergency_under_load",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "load_threads": args.load_threads,
+        "probes": args.probes,
+        "model_stub": {"batch_latency_ms": args.model_latency_ms, "per_prompt_ms": args.model_per_prompt_ms},
+        "runs": runs,
+    }
+    status = write_result(result, args)
+    p99 = runs[-1]["stages"].get("emergency", {}).get("p99_ms", float("inf"))
+    if p99 > args.emergency_p99_ms or runs[-1]["stage_mismatches"]:
+        print(f"REGRESI: p99 darurat {p99:.2f} ms > batas {args.emergency_p99_ms:.2f} ms "
+              f"atau {runs[-1]['stage_mismatches']} pesan darurat tidak terdeteksi", file=sys.stderr)
+        return 1
+    return status
+
+
+def write_result(result: Dict, args) -> int:
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESI: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    configure_logging(os.environ.get("BENCH_LOG_LEVEL", "WARNING"))
+    sys.exit(main())
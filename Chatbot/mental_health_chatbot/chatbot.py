@@ -1,33 +1,80 @@
-import json
-import re
+import time
+import queue
 import random
+import asyncio
 import logging
-from typing import Dict, List, Optional, Callable
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional
 from pathlib import Path
 from dataclasses import dataclass
 
-# Import pustaka yang diperlukan untuk model AI
-try:
-    from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
-except ImportError:
-    print("Peringatan: Pustaka 'transformers' tidak ditemukan. Bot akan berjalan dalam mode rule-based saja.")
-    BlenderbotTokenizer, BlenderbotForConditionalGeneration = None, None
-
-# Konfigurasi logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from content_store import SNAPSHOT_CACHE_DIR, ContentSnapshot, ContentStore
+from flows import FlowDefinition, FlowStep
+from matcher import MatchResult, MessageMatcher
+from metrics import REGISTRY
+from ml_engine import MODEL_NAME, InferenceBatcher, ModelLoader
+from response_cache import ResponseCache
+from retrieval import DEFAULT_THRESHOLD as RETRIEVAL_THRESHOLD, RetrievalHit
+from session_store import ContextBackend, SessionStore
+from startup import STARTUP
+
+# Logging global dikonfigurasi oleh entry point (startup.configure_logging), bukan saat import.
 logger = logging.getLogger(__name__)
 
+MAX_HISTORY = 10
+FLOW_COMPLETE_SUFFIX = "<br><br>Terima kasih sudah berbagi. Apakah ada topik lain?"
+
+# Nama tahap pipeline `generate_response`, dipakai untuk benchmark, metrik, dan audit.
+STAGE_EMPTY = "empty"
+STAGE_EMERGENCY = "emergency"
+# Label metrik durasi penyaring jalur cepat; balasannya tetap bertahap STAGE_EMERGENCY.
+STAGE_EMERGENCY_SCREEN = "emergency_screen"
+STAGE_ACTIVE_FLOW = "active_flow"
+STAGE_START_FLOW = "start_flow"
+STAGE_TOPIC = "topic_suggestion"
+STAGE_QA = "qa"
+STAGE_RETRIEVAL = "retrieval"
+STAGE_ML = "ml"
+STAGE_FALLBACK = "fallback"
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chatbot_stage_duration_seconds", "Waktu yang dihabiskan setiap tahap keputusan pipeline.", ["stage"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "chatbot_request_duration_seconds", "Latensi total respons, dikelompokkan per tahap yang menjawab.", ["stage"])
+RESPONSES = REGISTRY.counter(
+    "chatbot_responses_total", "Jumlah respons per tahap yang menjawab.", ["stage"])
+
+def _observe_stage(stage: str, started: float) -> float:
+    """Mencatat durasi satu tahap dan mengembalikan waktu sekarang untuk tahap berikutnya."""
+    now = time.perf_counter()
+    STAGE_SECONDS.labels(stage).observe(now - started)
+    return now
+
+def _observe_response(result: "ChatResult", started: float) -> "ChatResult":
+    RESPONSES.labels(result.stage).inc()
+    REQUEST_SECONDS.labels(result.stage).observe(time.perf_counter() - started)
+    return result
+
 @dataclass
-class FlowDefinition:
-    steps: List[Callable]
-    description: str = "A guided conversation flow."
+class ChatResult:
+    response: str
+    stage: str
+    topic: Optional[str] = None  # flow aktif/dimulai, topik yang disarankan, atau intent Q&A
+    emergency: bool = False
 
 class ConversationContext:
+    # __slots__ menjaga jejak memori per sesi tetap kecil saat ada ribuan sesi aktif.
+    __slots__ = ("active_flow", "flow_step", "data", "conversation_history", "lock")
+
     def __init__(self):
         self.active_flow: Optional[str] = None
         self.flow_step: int = 0
         self.data: Dict = {}
-        self.conversation_history: List[str] = []
+        self.conversation_history: Deque[str] = deque(maxlen=MAX_HISTORY)
+        # Menyerialkan request bersamaan dari sesi yang sama.
+        self.lock = threading.RLock()
 
     def start_flow(self, flow_name: str) -> None:
         self.active_flow = flow_name
@@ -35,75 +82,168 @@ class ConversationContext:
         self.data = {}
         logger.info(f"New flow started: '{flow_name}'")
 
-    def advance_flow(self) -> None:
+    def advance_flow(self, step: Optional[int] = None) -> None:
         if self.active_flow:
-            self.flow_step += 1
+            self.flow_step = self.flow_step + 1 if step is None else step
             logger.info(f"Flow '{self.active_flow}' advanced to step {self.flow_step}")
 
     def add_to_history(self, message: str) -> None:
         self.conversation_history.append(message)
-        if len(self.conversation_history) > 10:
-            self.conversation_history = self.conversation_history[-10:]
 
     def get_history_string(self) -> str:
         """Menggabungkan riwayat percakapan menjadi satu string."""
         return "\n".join(self.conversation_history)
 
+    def to_state(self) -> list:
+        # Flow disimpan sebagai nama + indeks step; step dicari ulang dari tabel flow snapshot.
+        return [self.active_flow, self.flow_step, self.data, list(self.conversation_history)]
+
+    @classmethod
+    def from_state(cls, state: list) -> "ConversationContext":
+        context = cls()
+        context.active_flow, context.flow_step, context.data, history = state
+        context.conversation_history.extend(history)
+        return context
+
     def reset(self) -> None:
         logger.info("Conversation context completely reset.")
-        self.__init__()
+        # Lock sengaja tidak diganti karena mungkin sedang dipegang oleh request ini.
+        self.active_flow = None
+        self.flow_step = 0
+        self.data = {}
+        self.conversation_history.clear()
 
 class MentalHealthChatbot:
-    def __init__(self, data_dir: Optional[str] = None):
+    def __init__(self, data_dir: Optional[str] = None, max_sessions: int = 10000,
+                 session_ttl: float = 1800.0, model_mode: str = "background",
+                 model_name: str = MODEL_NAME, model_backend: str = "pytorch",
+                 batcher_options: Optional[Dict] = None,
+                 ml_timeout: Optional[float] = 30.0,
+                 response_cache: Optional[ResponseCache] = None, watch_data: bool = False,
+                 context_backend: Optional[ContextBackend] = None,
+                 retrieval_threshold: float = RETRIEVAL_THRESHOLD,
+                 emergency_fast_path: bool = True,
+                 snapshot_cache_dir: Optional[str] = SNAPSHOT_CACHE_DIR):
         self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent / 'data'
-        
-        self.knowledge_base = self._load_data('knowledge_base.json')
-        self.qa_pairs = self._load_data('qa_pairs.json')
-        self.emergency_data = self._load_data('emergency.json')
-        
-        self.context = ConversationContext()
+
+        # Konteks per sesi; `_default_context` dipakai pemanggil lama tanpa session_id.
+        # Berikan `context_backend` (mis. SQLiteSessionStore) agar sesi dipakai bersama antar worker.
+        if context_backend is None:
+            context_backend = SessionStore(ConversationContext, max_sessions=max_sessions, ttl_seconds=session_ttl)
+        self.sessions = context_backend
+        self._default_context = ConversationContext()
+        self._local = threading.local()
         self._initialize_topic_mapping()
-        self._initialize_guided_flows()
-        
-        self.emergency_keywords = self.emergency_data.get('emergency_keywords', [])
-
-        # [BARU] Inisialisasi dan pemuatan model AI
-        self.ml_tokenizer = None
-        self.ml_model = None
-        self._load_ml_model()
-
-    def _load_data(self, filename: str) -> Dict:
-        # (Fungsi ini tetap sama)
-        file_path = self.data_dir / filename
-        if not file_path.exists():
-            logger.warning(f"Data file not found: {file_path}.")
-            return {}
+
+        # Data JSON dan matcher turunannya hidup dalam snapshot yang bisa di-reload.
+        # `snapshot_cache_dir=None` mematikan cache snapshot (lihat content_store.py).
+        with STARTUP.phase("chatbot: content store"):
+            self.content = ContentStore(self.data_dir, self.topic_keywords, cache_dir=snapshot_cache_dir)
+        if watch_data:
+            self.content.start_watching()
+
+        # [BARU] Inisialisasi dan pemuatan model AI (lihat ml_engine.MODEL_MODES)
+        with STARTUP.phase(f"chatbot: model loader ({model_mode})"):
+            self.model_loader = ModelLoader(model_name, mode=model_mode, backend=model_backend)
+            self.model_loader.start()
+        # Semua inferensi lewat satu worker yang menggabungkan prompt menjadi batch.
+        self.batcher = InferenceBatcher(self.model_loader, **(batcher_options or {}))
+        self.ml_timeout = ml_timeout
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # Skor kosinus minimum agar hasil indeks retrieval dipakai tanpa memanggil model.
+        self.retrieval_threshold = retrieval_threshold
+        # Pesan darurat disaring sebelum sesi dimuat (lihat `screen_emergency`).
+        self.emergency_fast_path = emergency_fast_path
+
+    @property
+    def context(self) -> ConversationContext:
+        """Konteks milik request yang sedang diproses oleh thread ini."""
+        return getattr(self._local, 'context', None) or self._default_context
+
+    @property
+    def snapshot(self) -> ContentSnapshot:
+        """Snapshot data milik request ini, atau snapshot terbaru di luar request."""
+        return getattr(self._local, 'snapshot', None) or self.content.snapshot
+
+    @property
+    def knowledge_base(self) -> Dict:
+        return self.snapshot.knowledge_base
+
+    @property
+    def qa_pairs(self) -> Dict:
+        return self.snapshot.qa_pairs
+
+    @property
+    def emergency_data(self) -> Dict:
+        return self.snapshot.emergency_data
+
+    @property
+    def emergency_keywords(self) -> List[str]:
+        return self.snapshot.emergency_keywords
+
+    @property
+    def matcher(self) -> MessageMatcher:
+        return self.snapshot.matcher
+
+    @property
+    def flows(self) -> Dict[str, FlowDefinition]:
+        return self.snapshot.flows
+
+    @contextmanager
+    def _checkout(self, session_id: Optional[str]) -> Iterator[ConversationContext]:
+        """Memuat dan mengunci konteks sesi; perubahan disimpan ke backend saat blok selesai."""
+        if not session_id:
+            with self._default_context.lock:
+                yield self._default_context
+        else:
+            with self.sessions.session(session_id) as context:
+                yield context
+
+    @contextmanager
+    def _request_scope(self, session_id: Optional[str]) -> Iterator[ConversationContext]:
+        """
+        Mengikat konteks sesi dan satu snapshot data ke thread ini selama request,
+        agar reload data di tengah request tidak menghasilkan campuran dua versi.
+        """
+        with self._checkout(session_id) as context:
+            self._local.context = context
+            self._local.snapshot = self.content.snapshot
+            try:
+                yield context
+            finally:
+                self._local.context = None
+                self._local.snapshot = None
+
+    @contextmanager
+    def random_source(self, rng: Optional[random.Random]) -> Iterator[None]:
+        """
+        Pilihan respons acak di thread ini diambil dari `rng` selama blok berjalan,
+        agar replay paralel bisa direproduksi; None berarti modul `random` global.
+        """
+        previous = getattr(self._local, 'rng', None)
+        self._local.rng = rng
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading {file_path}: {e}")
-            return {}
+            yield
+        finally:
+            self._local.rng = previous
 
-    def _load_ml_model(self):
-        """[FUNGSI BARU] Memuat model AI BlenderBot dari Hugging Face."""
-        if BlenderbotTokenizer is None:
-            logger.warning("Tidak bisa memuat model AI karena pustaka 'transformers' tidak ada.")
-            return
+    def _choice(self, options: List[str]) -> str:
+        return (getattr(self._local, 'rng', None) or random).choice(options)
 
-        try:
-            logger.info("Mencoba memuat model AI BlenderBot (mungkin butuh waktu saat pertama kali)...")
-            model_name = "facebook/blenderbot_small-90M"
-            self.ml_tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
-            self.ml_model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
-            logger.info("Model AI BlenderBot berhasil dimuat.")
-        except Exception as e:
-            logger.error(f"Gagal memuat model AI: {e}")
-            logger.warning("Chatbot akan berjalan dalam mode rule-based saja.")
-            self.ml_tokenizer = None
-            self.ml_model = None
-            
-    # ... (Semua fungsi _initialize dan _..._step tetap sama persis seperti sebelumnya) ...
+    @property
+    def model_ready(self) -> bool:
+        """True jika model fallback sudah siap dipakai tanpa menunggu."""
+        return self.model_loader.ready
+
+    @property
+    def ml_tokenizer(self):
+        return self.model_loader.tokenizer
+
+    @property
+    def ml_model(self):
+        return self.model_loader.model
+
+    # Keyword per topik untuk saran topik; langkah-langkah flow didefinisikan di data (lihat flows.py).
     def _initialize_topic_mapping(self):
         self.topic_keywords = {
             "stres": ["stres", "stress", "tertekan", "beban", "tekanan", "kewalahan", "overwhelmed"],
@@ -124,35 +264,13 @@ class MentalHealthChatbot:
             "bpd": ["bpd", "borderline", "borderline personality disorder", "gangguan kepribadian"]
         }
 
-    def _find_relevant_topic(self, text: str) -> Optional[str]:
+    def _scan(self, text: str) -> MatchResult:
+        """Satu kali scan keyword untuk semua tahap (topik, Q&A, darurat)."""
+        return self.matcher.scan(text.lower().strip())
+
+    def _find_relevant_topic(self, text: str, hits: Optional[MatchResult] = None) -> Optional[str]:
         if not text: return None
-        text_lower = text.lower().strip()
-        topic_scores = {
-            topic: sum(1 for kw in keywords if re.search(r'\b' + re.escape(kw) + r'\b', text_lower))
-            for topic, keywords in self.topic_keywords.items()
-        }
-        scored_topics = {topic: score for topic, score in topic_scores.items() if score > 0}
-        return max(scored_topics, key=scored_topics.get) if scored_topics else None
-
-    def _initialize_guided_flows(self) -> None:
-        self._guided_flows = {
-            "stres": FlowDefinition([self._stres_step0, self._stres_step1]),
-            "kecemasan": FlowDefinition([self._kecemasan_step0, self._kecemasan_step1]),
-            "depresi": FlowDefinition([self._depresi_step0, self._depresi_step1]),
-            "marah": FlowDefinition([self._marah_step0, self._marah_step1]),
-            "overthinking": FlowDefinition([self._overthinking_step0, self._overthinking_step1, self._overthinking_step2]),
-            "insomnia": FlowDefinition([self._insomnia_step0, self._insomnia_step1]),
-            "perpisahan": FlowDefinition([self._perpisahan_step0, self._perpisahan_step1]),
-            "kesepian": FlowDefinition([self._kesepian_step0, self._kesepian_step1]),
-            "masalah_keluarga": FlowDefinition([self._masalah_keluarga_step0, self._masalah_keluarga_step1]),
-            "media_sosial": FlowDefinition([self._media_sosial_step0, self._media_sosial_step1]),
-            "quarter_life_crisis": FlowDefinition([self._qlc_step0, self._qlc_step1]),
-            "motivasi": FlowDefinition([self._motivasi_step0, self._motivasi_step1]),
-            "self_care": FlowDefinition([self._self_care_step0, self._self_care_step1]),
-            "bpd": FlowDefinition([self._bpd_step0]),
-            "trauma": FlowDefinition([self._trauma_step0, self._trauma_step1]),
-            "burnout": FlowDefinition([self._burnout_step0, self._burnout_step1]),
-        }
+        return (hits or self._scan(text)).best_topic
 
     def _get_contextual_response(self, suggested_topic: str) -> str:
         topic_display = suggested_topic.replace('_', ' ').title()
@@ -162,242 +280,378 @@ class MentalHealthChatbot:
             f"lebih dalam? Kamu bisa klik topik tersebut atau balas dengan '{suggested_topic}' untuk memulai."
         )
 
-    def _stres_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Tentu, mari kita bahas tentang stres. Aku dengar kamu sedang merasa tertekan. Perasaan itu valid.<br><br>Boleh ceritakan sedikit, apa hal spesifik yang paling membuatmu merasa stres akhir-akhir ini?"""
-
-    def _stres_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Terima kasih sudah berbagi. Menghadapi '{user_input}' memang tidak mudah. Mengakui sumber stres adalah langkah pertama yang hebat.<br><br>Ingat, fokus pada satu hal kecil yang bisa kamu kontrol saat ini. Kamu tidak harus menyelesaikan semuanya sekaligus."""
-
-    def _kecemasan_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Mari kita bicara tentang kecemasan. Rasa khawatir dan gelisah itu sangat menguras energi.<br><br>Saat rasa cemas itu datang, apa yang biasanya kamu rasakan di tubuhmu? (Contoh: jantung berdebar, napas pendek, tangan dingin)"""
-
-    def _kecemasan_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Terima kasih telah menjelaskannya. Mengenali respons tubuh adalah langkah penting. Saat itu terjadi lagi, coba satu hal ini: Tarik napas perlahan selama 4 detik, tahan 4 detik, lalu hembuskan perlahan selama 6 detik. Lakukan beberapa kali. Ini dapat membantu menenangkan sistem sarafmu."""
-
-    def _depresi_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Aku di sini bersamamu untuk membahas perasaan sedih dan hampa. Kamu tidak sendirian.<br><br>Selain merasa sedih, adakah aktivitas yang dulu kamu nikmati tapi sekarang terasa tidak menarik lagi?"""
-
-    def _depresi_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Kehilangan minat atau 'anhedonia' adalah gejala yang sangat umum. Terima kasih sudah jujur. Tidak apa-apa jika saat ini terasa berat. Bisakah kita pikirkan satu hal SANGAT kecil yang mungkin bisa kamu coba lakukan besok? (Contoh: duduk di luar selama 5 menit, atau mendengarkan satu lagu favorit)."""
-
-    def _marah_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Rasa marah dan frustrasi adalah emosi yang kuat. Tidak apa-apa merasakannya.<br><br>Jika kamu nyaman, coba gambarkan: kemarahan ini terasa seperti apa? Apakah seperti api yang membakar, atau tekanan yang akan meledak?"""
-
-    def _marah_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Deskripsi yang kuat. Terkadang, di balik kemarahan ada perasaan lain seperti sakit hati atau ketidakadilan. Mengakui emosi ini adalah langkah awal untuk mengelolanya secara sehat, bukan menekannya."""
-        
-    def _overthinking_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Tentu, mari kita coba jinakkan pikiran yang berputar-putar itu. Overthinking sangat melelahkan.<br><br>Langkah pertama, coba tuliskan satu pikiran negatif spesifik yang paling sering muncul di kepalamu."""
-
-    def _overthinking_step1(self, user_input: str) -> str:
-        self.context.data['negative_thought'] = user_input
-        self.context.advance_flow()
-        return f"""Oke, pikiranmu adalah: '<i>{user_input}</i>'.<br><br>Sekarang, mari kita uji. Apa satu bukti kuat yang mendukung pikiran ini? Dan apa satu bukti kuat yang membantahnya?"""
-
-    def _overthinking_step2(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Bagus sekali. Kamu sudah mulai melihatnya dari dua sisi. Ini adalah keterampilan yang hebat. Latihan ini membantu otak kita untuk tidak langsung percaya pada pikiran negatif pertama yang muncul."""
-
-    def _insomnia_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Sulit tidur memang sangat mengganggu. Mari kita lihat.<br><br>Apa yang biasanya ada di pikiranmu atau kamu lakukan satu jam sebelum mencoba untuk tidur?"""
-
-    def _insomnia_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Terima kasih. Seringkali, apa yang kita lakukan sebelum tidur (screen time, memikirkan kerjaan) sangat berpengaruh. Menciptakan 'zona tenang' satu jam sebelum tidur tanpa gadget bisa membuat perbedaan besar."""
-
-    def _perpisahan_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Patah hati karena perpisahan itu nyata dan menyakitkan. Perasaanmu sangat valid.<br><br>Siapa yang kamu rindukan saat ini? Kamu tidak perlu menyebut nama, cukup perannya dalam hidupmu (misalnya: 'sahabat baik' atau 'pasangan')."""
-
-    def _perpisahan_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Kehilangan seorang {user_input} meninggalkan ruang kosong. Izinkan dirimu untuk berduka. Tidak ada batas waktu untuk pulih. Merawat dirimu sendiri saat ini adalah prioritas utama."""
-
-    def _kesepian_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Perasaan kesepian itu berat, seolah tak terlihat. Aku melihatmu dan aku di sini mendengarkan.<br><br>Jika kamu bisa memilih, koneksi seperti apa yang paling kamu dambakan saat ini?"""
-
-    def _kesepian_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Mendambakan '{user_input}' itu sangat manusiawi. Langkah pertama untuk keluar dari kesepian adalah dengan jujur pada keinginan itu. Terima kasih sudah terbuka."""
-    
-    def _masalah_keluarga_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Konflik keluarga bisa sangat menguras energi dan menyakitkan karena terjadi di tempat yang seharusnya aman.<br><br>Tanpa perlu detail, perasaan apa yang paling dominan saat kamu memikirkan masalah ini? (Contoh: marah, sedih, lelah, kecewa)"""
-
-    def _masalah_keluarga_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Merasa {user_input} adalah respons yang sangat wajar dalam situasi seperti itu. Ingat, kamu berhak memiliki batasan untuk melindungi kedamaian mentalmu, bahkan dari keluarga."""
-
-    def _media_sosial_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Lelah dengan media sosial itu sangat umum sekarang. Terkadang apa yang kita lihat di sana membuat kita merasa kurang.<br><br>Aplikasi atau konten seperti apa yang paling sering membuatmu merasa buruk tentang dirimu sendiri?"""
-
-    def _media_sosial_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Itu wawasan yang bagus. Menyadari pemicunya adalah langkah besar. Mungkin kamu bisa mencoba fitur 'mute' atau 'unfollow' akun-akun tersebut? Kamu berhak menciptakan linimasa yang mendukung, bukan yang menjatuhkan."""
-
-    def _qlc_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Ah, 'quarter-life crisis'. Merasa bingung, tersesat, dan membandingkan diri dengan orang lain. Sangat umum dan sangat berat.<br><br>Dari semua aspek (karir, hubungan, tujuan hidup), mana yang terasa paling tidak pasti saat ini?"""
-
-    def _qlc_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Fokus pada ketidakpastian di '{user_input}' itu bisa membuat kewalahan. Ingat, tidak ada orang yang punya semua jawaban. Tidak apa-apa untuk tidak tahu. Langkahmu saat ini adalah bertahan dan terus mencoba hal-hal kecil."""
-
-    def _motivasi_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Kehilangan motivasi itu seperti mobil kehabisan bensin. Bukan mobilnya yang rusak, hanya butuh bahan bakar.<br><br>Apa satu hal yang jika berhasil kamu lakukan, akan membuatmu merasa sedikit lebih baik, sekecil apapun itu?"""
-
-    def _motivasi_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""'{user_input}' terdengar seperti tujuan yang bagus. Coba pecah menjadi langkah yang SANGAT KECIL. Apa langkah paling pertama yang bisa kamu ambil untuk itu?"""
-
-    def _self_care_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Merawat diri atau 'self-care' bukan kemewahan, tapi kebutuhan. Ini tentang mengisi kembali energimu.<br><br>Apa aktivitas self-care favoritmu, atau apa yang ingin kamu coba lakukan untuk dirimu sendiri?"""
-
-    def _self_care_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Melakukan '{user_input}' terdengar sangat menenangkan. Aku harap kamu bisa meluangkan waktu untuk itu. Kamu pantas mendapatkannya."""
-
-    def _trauma_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Membicarakan trauma itu berat, dan aku di sini untuk mendengarkan dengan hati-hati. Keamananmu adalah yang utama.<br><br>Saat ini, apa yang kamu butuhkan untuk merasa sedikit lebih aman atau tenang?"""
-
-    def _trauma_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Terima kasih. Fokus pada kebutuhanmu saat ini ('ingin merasa aman') adalah hal yang tepat. Jika kamu merasa kewalahan, teknik grounding (menyebutkan 5 benda yang kamu lihat) bisa membantu menarikmu kembali ke saat ini."""
-    
-    def _burnout_step0(self, _: Optional[str] = None) -> str:
-        self.context.advance_flow()
-        return f"""Kelelahan kerja atau 'burnout' lebih dari sekadar lelah biasa. Ini adalah kelelahan emosional, fisik, dan mental yang mendalam.<br><br>Gejala mana yang paling kamu rasakan: kelelahan total, sinisme/sikap negatif terhadap pekerjaan, atau merasa tidak kompeten?"""
-
-    def _burnout_step1(self, user_input: str) -> str:
-        self.context.reset()
-        return f"""Merasakan '{user_input}' adalah tanda jelas dari burnout. Ini bukan salahmu, ini adalah respons terhadap stres kronis. Istirahat yang sesungguhnya—bukan hanya libur tapi benar-benar lepas dari pekerjaan—sangatlah penting."""
-
-    def _bpd_step0(self, _: Optional[str] = None) -> str:
-        self.context.reset()
-        info = self.knowledge_base.get('bpd', {})
-        definisi = info.get('definition', 'Informasi tidak ditemukan.')
-        return f"""Tentu, ini adalah informasi umum mengenai <strong>Borderline Personality Disorder (BPD)</strong>.<br><br><strong>Definisi:</strong> {definisi}<br><br>Ini adalah kondisi kompleks yang memerlukan diagnosis dan perawatan dari profesional. Jika kamu merasa ini relevan, berbicara dengan psikolog adalah langkah terbaik."""
+    def generate_response(self, input_text: str, session_id: Optional[str] = None) -> str:
+        return self.respond(input_text, session_id).response
+
+    async def generate_response_async(self, input_text: str, session_id: Optional[str] = None,
+                                      timeout: Optional[float] = None) -> str:
+        return (await self.respond_async(input_text, session_id, timeout)).response
+
+    def screen_emergency(self, input_text: str) -> Optional[ChatResult]:
+        """
+        Jalur cepat darurat: dijalankan sebelum konteks sesi dimuat dan tidak pernah
+        menyentuh model, sehingga pesan darurat tidak menunggu lock sesi, I/O backend
+        sesi (transaksi SQLite yang antre di belakang worker lain), maupun thread pool
+        ASGI yang sedang penuh oleh stream model. Mengembalikan None jika pesan bukan
+        darurat atau jalur cepat mati.
+
+        Karena sesi tidak dimuat, pesan darurat tidak dicatat ke riwayat dan flow
+        yang sedang aktif tetap utuh untuk pesan berikutnya.
+        """
+        if not self.emergency_fast_path or not input_text or not input_text.strip():
+            return None
+        started = time.perf_counter()
+        emergency = self.content.snapshot.emergency_screener.screen(input_text)
+        _observe_stage(STAGE_EMERGENCY_SCREEN, started)
+        if not emergency:
+            return None
+        return _observe_response(ChatResult(self._emergency_response(), STAGE_EMERGENCY, emergency=True), started)
+
+    def respond(self, input_text: str, session_id: Optional[str] = None) -> ChatResult:
+        """Seperti `generate_response`, tetapi juga melaporkan tahap yang menjawab."""
+        started = time.perf_counter()
+        if not input_text or not input_text.strip():
+            return _observe_response(
+                ChatResult("Aku di sini mendengarkan. Apa yang ingin kamu ceritakan?", STAGE_EMPTY), started)
+        if (result := self.screen_emergency(input_text)) is not None:
+            return result
+
+        # Step flow mengakses `self.context`, jadi konteks sesi diikat ke thread ini.
+        # Sesi dilepas sebelum menunggu model agar lock (dan transaksi SQLite) tetap singkat.
+        input_text = input_text.strip()
+        if (result := self._respond_rule_based_in_scope(input_text, session_id)) is None:
+            result = self._respond_with_model(input_text, session_id)
+        return _observe_response(result, started)
+
+    async def respond_async(self, input_text: str, session_id: Optional[str] = None,
+                            timeout: Optional[float] = None) -> ChatResult:
+        """
+        Versi asyncio dari `respond` untuk mode ASGI.
+        Dengan sesi in-memory, tahap rule-based dijawab langsung di event loop (tanpa
+        await, jadi atomik terhadap coroutine lain); backend sesi yang melakukan I/O
+        (SQLite) dijalankan di thread pool. Inferensi model dikirim ke worker inferensi
+        dan diberi batas waktu. Jika waktu habis, turun ke `_get_smart_fallback_response`.
+        """
+        started = time.perf_counter()
+        if not input_text or not input_text.strip():
+            return _observe_response(
+                ChatResult("Aku di sini mendengarkan. Apa yang ingin kamu ceritakan?", STAGE_EMPTY), started)
+
+        if (result := self.screen_emergency(input_text)) is not None:
+            return result
 
-    def generate_response(self, input_text: str) -> str:
+        input_text = input_text.strip()
+        if (result := await self._session_io(self._respond_rule_based_in_scope, input_text, session_id)) is not None:
+            return _observe_response(result, started)
+
+        timeout = self.ml_timeout if timeout is None else timeout
+        stage_started = time.perf_counter()
+        ml_response = await self._generate_ml_response_async(input_text, session_id, timeout)
+        stage_started = _observe_stage(STAGE_ML, stage_started)
+        if ml_response:
+            return _observe_response(ChatResult(ml_response, STAGE_ML), started)
+        fallback = self._get_smart_fallback_response()
+        _observe_stage(STAGE_FALLBACK, stage_started)
+        return _observe_response(ChatResult(fallback, STAGE_FALLBACK), started)
+
+    def _respond_rule_based_in_scope(self, input_text: str, session_id: Optional[str]) -> Optional[ChatResult]:
+        with self._request_scope(session_id):
+            return self._respond_rule_based(input_text)
+
+    async def _session_io(self, func, *args):
+        """Menjalankan `func(*args)` yang memuat/menyimpan sesi tanpa memblokir event loop."""
+        if isinstance(self.sessions, SessionStore):
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def respond_stream(self, input_text: str, session_id: Optional[str] = None,
+                       screen: bool = True) -> Iterator[str]:
+        """
+        Versi streaming: jawaban rule-based dikirim utuh sebagai satu potongan,
+        sedangkan balasan model dikirim token demi token begitu dihasilkan.
+        `screen=False` jika pemanggil sudah menjalankan `screen_emergency` sendiri.
+        """
+        started = time.perf_counter()
         if not input_text or not input_text.strip():
-            return "Aku di sini mendengarkan. Apa yang ingin kamu ceritakan?"
-        
+            yield "Aku di sini mendengarkan. Apa yang ingin kamu ceritakan?"
+            return
+
+        if screen and (result := self.screen_emergency(input_text)) is not None:
+            yield result.response
+            return
+
         input_text = input_text.strip()
+        # Tidak boleh ada yield di dalam request scope: thread-local harus dilepas dulu.
+        with self._request_scope(session_id):
+            result = self._respond_rule_based(input_text)
+        if result is not None:
+            _observe_response(result, started)
+            yield result.response
+            return
+
+        t = time.perf_counter()
+        chunks = []
+        for chunk in self._stream_ml_response(input_text):
+            chunks.append(chunk)
+            yield chunk
+        t = _observe_stage(STAGE_ML, t)
+        if (ml_response := "".join(chunks).strip()):
+            with self._checkout(session_id) as context:
+                self._remember_ml_response(context, ml_response)
+            _observe_response(ChatResult(ml_response, STAGE_ML), started)
+            return
+
+        fallback = self._get_smart_fallback_response()
+        _observe_stage(STAGE_FALLBACK, t)
+        _observe_response(ChatResult(fallback, STAGE_FALLBACK), started)
+        yield fallback
+
+    def _respond_with_model(self, input_text: str, session_id: Optional[str]) -> ChatResult:
+        # [PERUBAHAN UTAMA] 7. Gunakan Model AI sebagai Fallback Cerdas
+        t = time.perf_counter()
+        ml_response = self._generate_ml_response(input_text, session_id)
+        t = _observe_stage(STAGE_ML, t)
+        if ml_response:
+            return ChatResult(ml_response, STAGE_ML)
+
+        # 8. Fallback terakhir jika semua gagal (termasuk model AI)
+        fallback = self._get_smart_fallback_response()
+        _observe_stage(STAGE_FALLBACK, t)
+        return ChatResult(fallback, STAGE_FALLBACK)
+
+    def _respond_rule_based(self, input_text: str) -> Optional[ChatResult]:
+        """Tahap 1-5 yang murni rule-based dan selalu cepat."""
+        t = time.perf_counter()
         self.context.add_to_history(f"User: {input_text}")
+        hits = self._scan(input_text)
+        t = _observe_stage("match", t)
 
         # 1. Emergency Check
-        if (emergency_response := self._check_emergency(input_text)):
-            return emergency_response
+        emergency_response = self._check_emergency(input_text, hits)
+        t = _observe_stage(STAGE_EMERGENCY, t)
+        if emergency_response:
+            return ChatResult(emergency_response, STAGE_EMERGENCY, self.context.active_flow, emergency=True)
 
         # 2. Continue Active Flow
-        if self.context.active_flow:
-            return self._handle_active_flow(input_text)
+        if (flow_name := self.context.active_flow):
+            response = self._handle_active_flow(input_text)
+            t = _observe_stage(STAGE_ACTIVE_FLOW, t)
+            if response is not None:
+                return ChatResult(response, STAGE_ACTIVE_FLOW, flow_name)
 
         # 3. Start New Flow if input is an exact topic key
-        if (response := self._handle_start_flow(input_text)):
-            return response
+        response = self._handle_start_flow(input_text)
+        t = _observe_stage(STAGE_START_FLOW, t)
+        if response:
+            return ChatResult(response, STAGE_START_FLOW, input_text.lower())
 
         # 4. Suggest Topic based on keywords (PRIORITAS LEBIH TINGGI)
-        if (suggested_topic := self._find_relevant_topic(input_text)):
-            return self._get_contextual_response(suggested_topic)
+        suggested_topic = self._find_relevant_topic(input_text, hits)
+        if suggested_topic:
+            response = self._get_contextual_response(suggested_topic)
+        t = _observe_stage(STAGE_TOPIC, t)
+        if suggested_topic:
+            return ChatResult(response, STAGE_TOPIC, suggested_topic)
 
         # 5. Handle General Q&A (SETELAH CEK TOPIK)
-        if (qa_response := self._get_qa_response(input_text)):
-            return qa_response
-
-        # [PERUBAHAN UTAMA] 6. Gunakan Model AI sebagai Fallback Cerdas
-        if (ml_response := self._generate_ml_response(input_text)):
-            return ml_response
+        qa_response = self._get_qa_response(input_text, hits)
+        t = _observe_stage(STAGE_QA, t)
+        if qa_response:
+            return ChatResult(qa_response, STAGE_QA, hits.qa_intent)
+
+        # 6. Pencarian kemiripan untuk salah ketik/bahasa informal sebelum memakai model AI
+        hit = self.snapshot.retrieval.search(input_text, self.retrieval_threshold)
+        response = self._get_retrieval_response(hit) if hit else None
+        _observe_stage(STAGE_RETRIEVAL, t)
+        if response:
+            return ChatResult(response, STAGE_RETRIEVAL, hit.key)
+        return None
 
-        # 7. Fallback terakhir jika semua gagal (termasuk model AI)
-        return self._get_smart_fallback_response()
-    
     def _handle_active_flow(self, user_input: str) -> Optional[str]:
         """Manages the logic for a continuing conversation."""
+        context = self.context
         try:
-            flow_name = self.context.active_flow
-            step_index = self.context.flow_step
-            flow_def = self._guided_flows[flow_name]
-            if step_index < len(flow_def.steps):
-                step_function = flow_def.steps[step_index]
-                response = step_function(user_input)
-                if not self.context.active_flow:
-                    response += "<br><br>Terima kasih sudah berbagi. Apakah ada topik lain?"
+            flow = self.flows[context.active_flow]
+            if context.flow_step < len(flow.steps):
+                response = self._run_flow_step(context, flow.steps[context.flow_step], user_input)
+                if not context.active_flow:
+                    response += FLOW_COMPLETE_SUFFIX
                 return response
         except Exception as e:
-            logger.error(f"Error during flow '{self.context.active_flow}': {e}")
-            self.context.reset()
+            logger.error(f"Error during flow '{context.active_flow}': {e}")
+            context.reset()
             return "Maaf, ada sedikit kendala. Mari kita mulai dari awal."
         return None
 
     def _handle_start_flow(self, user_input: str) -> Optional[str]:
         """Starts a new flow if the input is a recognized topic key."""
         input_key = user_input.lower().strip()
-        if input_key in self._guided_flows:
+        flow = self.flows.get(input_key)
+        if flow is not None:
+            context = self.context
             try:
-                self.context.start_flow(input_key)
-                step_function = self._guided_flows[input_key].steps[0]
-                return step_function()
+                context.start_flow(input_key)
+                return self._run_flow_step(context, flow.steps[0], "")
             except Exception as e:
                 logger.error(f"Error starting flow '{input_key}': {e}")
-                self.context.reset()
+                context.reset()
                 return "Maaf, terjadi kesalahan saat memulai topik itu."
         return None
-        
-    def _generate_ml_response(self, text: str) -> Optional[str]:
+
+    def _run_flow_step(self, context: ConversationContext, step: FlowStep, user_input: str) -> str:
+        """Interpreter satu step: tangkap variabel, render template, lalu pindah state."""
+        if step.capture:
+            context.data[step.capture] = user_input
+        response = step.render(user_input, context.data, self.knowledge_base if step.uses_knowledge else None)
+        if step.next_step is None:
+            context.reset()
+        else:
+            context.advance_flow(step.next_step)
+        return response
+
+    def _generate_ml_response(self, text: str, session_id: Optional[str]) -> Optional[str]:
         """[FUNGSI BARU] Menghasilkan respons menggunakan model AI jika tersedia."""
-        if not self.ml_model or not self.ml_tokenizer:
-            return None # Model tidak dimuat, jadi lewati langkah ini
+        if self.model_loader.state == "disabled":
+            return None
 
-        try:
-            logger.info("Menggunakan model AI untuk menghasilkan respons...")
-            # [PERBAIKAN] Hanya gunakan input terakhir pengguna untuk model AI yang lebih simpel
-            inputs = self.ml_tokenizer(text, return_tensors="pt")
-            reply_ids = self.ml_model.generate(**inputs)
-            response = self.ml_tokenizer.batch_decode(reply_ids, skip_special_tokens=True)[0].strip()
+        # Balasan yang pernah dibuat model dilayani dari cache, bahkan saat model belum siap.
+        params = self._generation_params()
+        response = self.response_cache.get(text, params)
 
-            # Tambahkan respons bot ke riwayat
+        if response is None:
+            if not self._model_available():
+                return None
+            try:
+                logger.info("Menggunakan model AI untuk menghasilkan respons...")
+                # [PERBAIKAN] Hanya gunakan input terakhir pengguna untuk model AI yang lebih simpel
+                response = self.batcher.generate(text, timeout=self.ml_timeout)
+            except Exception as e:
+                logger.error(f"Error saat menghasilkan respons dari model AI: {e}")
+                return None
             if response:
-                self.context.add_to_history(f"Bot: {response}")
-                return response
+                self.response_cache.put(text, response, params)
+        if not response:
             return None
-        except Exception as e:
-            logger.error(f"Error saat menghasilkan respons dari model AI: {e}")
+        # Konteks dimuat ulang: selama menunggu model, request lain mungkin sudah mengubahnya.
+        return self._remember_in_session(session_id, response)
+
+    async def _generate_ml_response_async(self, text: str, session_id: Optional[str],
+                                          timeout: Optional[float]) -> Optional[str]:
+        if self.model_loader.state == "disabled":
+            return None
+
+        params = self._generation_params()
+        response = self.response_cache.get(text, params)
+
+        if response is None:
+            if not self._model_available():
+                return None
+            try:
+                logger.info("Menggunakan model AI untuk menghasilkan respons...")
+                future = asyncio.wrap_future(self.batcher.submit(text))
+                response = await asyncio.wait_for(future, timeout)
+            except queue.Full:
+                logger.warning("Antrean inferensi penuh, memakai fallback rule-based.")
+                return None
+            except asyncio.TimeoutError:
+                logger.warning(f"Inferensi melebihi batas waktu {timeout} detik, memakai fallback.")
+                return None
+            except Exception as e:
+                logger.error(f"Error saat menghasilkan respons dari model AI: {e}")
+                return None
+            if response:
+                self.response_cache.put(text, response, params)
+        if not response:
             return None
+        # Konteks dimuat ulang: selama menunggu model, request lain mungkin sudah mengubahnya.
+        return await self._session_io(self._remember_in_session, session_id, response)
+
+    def _remember_in_session(self, session_id: Optional[str], response: str) -> Optional[str]:
+        with self._checkout(session_id) as context:
+            return self._remember_ml_response(context, response)
+
+    def _stream_ml_response(self, text: str) -> Iterator[str]:
+        if self.model_loader.state == "disabled":
+            return
+        params = self._generation_params()
+        if (cached := self.response_cache.get(text, params)) is not None:
+            yield cached
+            return
+        if not self._model_available():
+            return
+
+        chunks = []
+        try:
+            logger.info("Menggunakan model AI (streaming) untuk menghasilkan respons...")
+            for chunk in self.batcher.stream(text, timeout=self.ml_timeout):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error saat streaming respons dari model AI: {e}")
+            return
+        if (response := "".join(chunks).strip()):
+            self.response_cache.put(text, response, params)
+
+    def _model_available(self) -> bool:
+        # Jangan pernah menunggu model; mode lazy mulai memuat di background.
+        if not self.model_ready:
+            if self.model_loader.mode == "lazy":
+                self.model_loader.ensure_loading()
+            return False
+        return True
+
+    @staticmethod
+    def _remember_ml_response(context: ConversationContext, response: Optional[str]) -> Optional[str]:
+        # Tambahkan respons bot ke riwayat
+        if response:
+            context.add_to_history(f"Bot: {response}")
+            return response
+        return None
 
-    def _check_emergency(self, text: str) -> Optional[str]:
+    def _generation_params(self) -> Dict:
+        return {"model": self.model_loader.model_id, **self.batcher.generate_kwargs}
+
+    def _check_emergency(self, text: str, hits: Optional[MatchResult] = None) -> Optional[str]:
         if not text or not self.emergency_keywords: return None
-        text_lower = text.lower()
-        if any(re.search(r'\b' + re.escape(kw) + r'\b', text_lower) for kw in self.emergency_keywords):
-            responses = self.emergency_data.get('emergency_responses', {})
-            return responses.get('bunuh_diri', "Keselamatanmu adalah prioritas. Segera hubungi bantuan darurat.")
+        # Dengan jalur cepat aktif, screener sudah dijalankan sebelum sesi dimuat.
+        if (hits or self._scan(text)).emergency or (
+                not self.emergency_fast_path and self.snapshot.emergency_screener.screen(text)):
+            return self._emergency_response()
         return None
 
-    def _get_qa_response(self, text: str) -> Optional[str]:
+    def _emergency_response(self) -> str:
+        responses = self.emergency_data.get('emergency_responses', {})
+        return responses.get('bunuh_diri', "Keselamatanmu adalah prioritas. Segera hubungi bantuan darurat.")
+
+    def _get_qa_response(self, text: str, hits: Optional[MatchResult] = None) -> Optional[str]:
         if not text or not self.qa_pairs: return None
-        text_lower = text.lower()
-        for data in self.qa_pairs.values():
-            if any(re.search(r'\b' + re.escape(p) + r'\b', text_lower) for p in data.get('patterns', [])):
-                return random.choice(data.get('responses', ["Maaf, aku tidak yakin."]))
-        return None
+        intent = (hits or self._scan(text)).qa_intent
+        if intent is None:
+            return None
+        return self._choice(self.qa_pairs[intent].get('responses', ["Maaf, aku tidak yakin."]))
+
+    def _get_retrieval_response(self, hit: RetrievalHit) -> Optional[str]:
+        if hit.kind == "qa":
+            return self._choice(self.qa_pairs[hit.key].get('responses', ["Maaf, aku tidak yakin."]))
+        if hit.kind == "topic" or hit.key in self.flows:
+            return self._get_contextual_response(hit.key)
+        return self._get_knowledge_response(hit.key)
+
+    def _get_knowledge_response(self, key: str) -> str:
+        """Informasi umum dari knowledge_base untuk topik tanpa flow (mis. ocd, bipolar, adhd)."""
+        info = self.knowledge_base.get(key, {})
+        nama = info.get('display_name', key.upper())
+        definisi = info.get('definition', 'Informasi tidak ditemukan.')
+        saran = "".join(
+            f"<br>• <strong>{s.get('title', '')}</strong>: {s.get('description', '')}"
+            for s in info.get('suggestions', [])
+        )
+        if saran:
+            saran = f"<br><br><strong>Beberapa hal yang bisa membantu:</strong>{saran}"
+        return f"""Tentu, ini adalah informasi umum mengenai <strong>{nama}</strong>.<br><br><strong>Definisi:</strong> {definisi}{saran}<br><br>Ini adalah kondisi kompleks yang memerlukan diagnosis dan perawatan dari profesional. Jika kamu merasa ini relevan, berbicara dengan psikolog adalah langkah terbaik."""
 
     def _get_smart_fallback_response(self) -> str:
-        return random.choice([
+        return self._choice([
             "Aku ingin sekali membantu, tapi aku kurang mengerti. Bisakah kamu pilih topik dari daftar yang ada?",
             "Terima kasih sudah berbagi. Aku masih belajar. Mungkin kita bisa mulai dengan memilih topik yang paling sesuai?",
         ])
@@ -0,0 +1,259 @@
+import json
+import os
+import sys
+import time
+import pickle
+import hashlib
+import logging
+import weakref
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from emergency import EmergencyScreener
+from flows import FlowDefinition, compile_flows
+from matcher import MessageMatcher
+from retrieval import RetrievalIndex
+from startup import STARTUP
+
+logger = logging.getLogger(__name__)
+
+CONTENT_FILES = ('knowledge_base.json', 'qa_pairs.json', 'emergency.json', 'topics.json', 'flows.json')
+
+# Cache snapshot: data JSON yang sudah di-parse beserta flow, matcher, screener, dan
+# indeks retrieval hasil kompilasi, di-pickle dengan kunci hash isi file. Worker baru
+# cukup membaca satu file alih-alih membangun ulang semuanya. CHATBOT_SNAPSHOT_CACHE=""
+# mematikannya. Direktori ini harus hanya bisa ditulis oleh deployer: pickle dieksekusi saat dibaca.
+SNAPSHOT_CACHE_DIR = os.environ.get("CHATBOT_SNAPSHOT_CACHE", str(Path(__file__).parent / "snapshot_cache")) or None
+SNAPSHOT_CACHE_KEEP = 4
+# Perubahan kode modul pembangun snapshot juga membatalkan cache.
+SNAPSHOT_BUILDERS = ('content_store.py', 'flows.py', 'matcher.py', 'emergency.py', 'retrieval.py')
+
+
+@dataclass(frozen=True)
+class ContentSnapshot:
+    """
+    Satu versi utuh dari data JSON beserta struktur turunannya.
+    Snapshot tidak pernah diubah setelah dibuat; reload menghasilkan snapshot baru.
+    """
+    version: int
+    knowledge_base: Dict
+    qa_pairs: Dict
+    emergency_data: Dict
+    topic_categories: List[Dict]
+    flows: Dict[str, FlowDefinition]
+    matcher: MessageMatcher
+    emergency_screener: EmergencyScreener
+    retrieval: RetrievalIndex
+    last_modified: float
+
+    @property
+    def emergency_keywords(self) -> List[str]:
+        return self.emergency_data.get('emergency_keywords', [])
+
+    @property
+    def hotlines(self) -> List[Dict]:
+        return self.emergency_data.get('hotlines', [])
+
+
+class ContentStore:
+    """
+    Memuat file JSON di direktori data dan menukar snapshot secara atomik saat
+    file berubah. Watcher memakai polling mtime di thread background, sehingga
+    parsing dan pembangunan matcher tidak pernah terjadi di jalur request. Request
+    yang sedang berjalan tetap memegang snapshot lama sampai selesai.
+    """
+
+    def __init__(self, data_dir: Path, topic_keywords: Dict[str, List[str]], poll_interval: float = 2.0,
+                 cache_dir: Optional[Path] = None):
+        self.data_dir = Path(data_dir)
+        self.topic_keywords = topic_keywords
+        self.poll_interval = poll_interval
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._raw: Dict[str, Dict] = {}
+        self._digests: Dict[str, Optional[str]] = {}
+        self._signature: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._fork_hook = False
+        self.snapshot: ContentSnapshot = self._reload(initial=True)
+
+    def start_watching(self) -> None:
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="content-watcher", daemon=True)
+            self._watcher.start()
+            if hasattr(os, "register_at_fork") and not self._fork_hook:
+                # Thread tidak ikut ter-fork (gunicorn --preload): watcher dijalankan
+                # ulang di setiap worker. Weakref agar hook tidak menahan store.
+                self._fork_hook = True
+                ref = weakref.ref(self)
+                os.register_at_fork(after_in_child=lambda: (store := ref()) is not None and store._restart_after_fork())
+
+    def _restart_after_fork(self) -> None:
+        if self._watcher is None or self._stop.is_set():
+            return
+        # Lock bisa saja sedang dipegang thread watcher induk saat fork terjadi.
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.start_watching()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def check_for_changes(self) -> bool:
+        """Membandingkan mtime file; jika ada yang berubah, parse ulang dan tukar snapshot."""
+        if self._current_signature() == self._signature:
+            return False
+        self.snapshot = self._reload()
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_changes()
+            except Exception as e:
+                logger.error(f"Gagal memeriksa perubahan data: {e}")
+
+    def _current_signature(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        signature = {}
+        for filename in CONTENT_FILES:
+            try:
+                st = os.stat(self.data_dir / filename)
+                signature[filename] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                signature[filename] = None
+        return signature
+
+    def _read_file(self, filename: str) -> Optional[bytes]:
+        file_path = self.data_dir / filename
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Data file not found: {file_path}.")
+        except OSError as e:
+            logger.error(f"Error loading {file_path}: {e}")
+        return None
+
+    def _parse_data(self, filename: str, content: Optional[bytes], initial: bool) -> Tuple[Dict, Optional[str]]:
+        """Isi file yang sudah di-parse beserta hash-nya; versi lama dipertahankan jika gagal."""
+        if content is not None:
+            try:
+                return json.loads(content.decode('utf-8')), hashlib.sha256(content).hexdigest()
+            except Exception as e:
+                logger.error(f"Error loading {self.data_dir / filename}: {e}")
+        # Saat reload, file yang hilang/rusak (mis. sedang ditulis) tidak menggantikan versi lama.
+        if initial:
+            return {}, None
+        return self._raw.get(filename, {}), self._digests.get(filename)
+
+    def _reload(self, initial: bool = False) -> ContentSnapshot:
+        with self._reload_lock:
+            signature = self._current_signature()
+            with STARTUP.phase("content: baca data"):
+                contents = {filename: self._read_file(filename) for filename in CONTENT_FILES}
+            digests = {filename: hashlib.sha256(content).hexdigest() if content is not None else None
+                       for filename, content in contents.items()}
+            cached = self._load_cached(digests)
+            if cached is not None:
+                raw, derived = cached
+            else:
+                with STARTUP.phase("content: parse JSON"):
+                    raw = {}
+                    for filename in CONTENT_FILES:
+                        raw[filename], digests[filename] = self._parse_data(filename, contents[filename], initial)
+                derived = self._build_derived(raw)
+                self._store_cached(digests, raw, derived)
+            snapshot = self._build_snapshot(raw, derived, signature)
+            self._raw, self._digests, self._signature = raw, digests, signature
+            if not initial:
+                logger.info(f"Data dimuat ulang, snapshot versi {snapshot.version}.")
+            return snapshot
+
+    def _build_derived(self, raw: Dict[str, Dict]) -> Dict:
+        """Struktur yang dikompilasi dari data JSON; bagian snapshot yang ikut di-cache."""
+        qa_pairs = raw['qa_pairs.json']
+        emergency_data = raw['emergency.json']
+        derived = {}
+        with STARTUP.phase("content: compile flows"):
+            derived['flows'] = compile_flows(raw['flows.json'])
+        with STARTUP.phase("content: build matcher"):
+            derived['matcher'] = MessageMatcher(self.topic_keywords, qa_pairs,
+                                                emergency_data.get('emergency_keywords', []))
+        with STARTUP.phase("content: build emergency screener"):
+            derived['emergency_screener'] = EmergencyScreener.from_emergency_data(emergency_data)
+        with STARTUP.phase("content: build retrieval index"):
+            derived['retrieval'] = RetrievalIndex.from_content(self.topic_keywords, qa_pairs,
+                                                               raw['knowledge_base.json'])
+        return derived
+
+    def _build_snapshot(self, raw: Dict[str, Dict], derived: Dict, signature: Dict) -> ContentSnapshot:
+        mtimes = [entry[0] / 1e9 for entry in signature.values() if entry]
+        previous = getattr(self, 'snapshot', None)
+        return ContentSnapshot(
+            version=previous.version + 1 if previous else 1,
+            knowledge_base=raw['knowledge_base.json'],
+            qa_pairs=raw['qa_pairs.json'],
+            emergency_data=raw['emergency.json'],
+            topic_categories=raw['topics.json'].get('categories', []),
+            last_modified=max(mtimes) if mtimes else time.time(),
+            **derived,
+        )
+
+    def _cache_path(self, digests: Dict[str, Optional[str]]) -> Optional[Path]:
+        if self.cache_dir is None or None in digests.values():
+            return None
+        key = hashlib.sha256()
+        key.update(f"{sys.version_info[:2]}|{pickle.HIGHEST_PROTOCOL}|".encode())
+        key.update(json.dumps(self.topic_keywords, sort_keys=True).encode('utf-8'))
+        key.update(_builders_digest().encode())
+        for filename in CONTENT_FILES:
+            key.update(f"|{filename}={digests[filename]}".encode())
+        return self.cache_dir / f"snapshot-{key.hexdigest()[:32]}.pickle"
+
+    def _load_cached(self, digests: Dict[str, Optional[str]]) -> Optional[Tuple[Dict, Dict]]:
+        path = self._cache_path(digests)
+        if path is None or not path.exists():
+            return None
+        try:
+            with STARTUP.phase("content: muat cache snapshot"):
+                with open(path, 'rb') as f:
+                    cached = pickle.load(f)
+            return cached['raw'], cached['derived']
+        except Exception as e:
+            logger.warning(f"Cache snapshot {path} tidak bisa dibaca, membangun ulang: {e}")
+            return None
+
+    def _store_cached(self, digests: Dict[str, Optional[str]], raw: Dict, derived: Dict) -> None:
+        path = self._cache_path(digests)
+        if path is None:
+            return
+        try:
+            with STARTUP.phase("content: tulis cache snapshot"):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Ditulis ke file sementara lalu di-rename agar worker lain tidak membaca file setengah jadi.
+                staging = path.with_name(f"{path.name}.tmp{os.getpid()}")
+                with open(staging, 'wb') as f:
+                    pickle.dump({'raw': raw, 'derived': derived}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(staging, path)
+                stale = sorted(path.parent.glob("snapshot-*.pickle"), key=lambda p: p.stat().st_mtime, reverse=True)
+                for old in stale[SNAPSHOT_CACHE_KEEP:]:
+                    old.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Cache snapshot tidak bisa ditulis ke {path}: {e}")
+
+
+_BUILDERS_DIGEST: Optional[str] = None
+
+
+def _builders_digest() -> str:
+    global _BUILDERS_DIGEST
+    if _BUILDERS_DIGEST is None:
+        digest = hashlib.sha256()
+        for filename in SNAPSHOT_BUILDERS:
+            digest.update((Path(__file__).parent / filename).read_bytes())
+        _BUILDERS_DIGEST = digest.hexdigest()
+    return _BUILDERS_DIGEST
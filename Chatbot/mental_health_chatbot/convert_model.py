@@ -0,0 +1,123 @@
+"""
+Konversi sekali jalan model BlenderBot ke backend inferensi yang lebih ringan,
+lalu cek kesamaan keluarannya dengan model referensi PyTorch.
+
+Contoh:
+    python convert_model.py --backend int8
+    python convert_model.py --backend onnx --force
+    python convert_model.py --backend onnx --check-only --prompts prompt.txt
+
+Artefak disimpan di CHATBOT_MODEL_CACHE (default: model_cache/ di samping file
+ini) dan dipakai worker saat CHATBOT_MODEL_BACKEND diisi backend yang sama.
+Exit code 1 jika kemiripan rata-rata keluaran di bawah --min-similarity.
+"""
+import sys
+import json
+import time
+import argparse
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import ml_engine
+from ml_engine import MODEL_BACKENDS, MODEL_NAME
+from startup import configure_logging
+
+PARITY_PROMPTS = [
+    "Hello, how are you today?",
+    "I have been feeling really stressed about work lately.",
+    "I can't sleep at night and I keep overthinking.",
+    "What do you like to do on weekends?",
+    "My best friend moved to another city and I feel lonely.",
+    "Do you have any tips for staying motivated?",
+    "I just failed my exam and I feel terrible.",
+    "Tell me something that makes you happy.",
+    "aku merasa capek banget hari ini",
+    "menurutmu musik bisa bikin tenang nggak?",
+]
+
+
+def generate(tokenizer, model, prompts: List[str], generate_kwargs: Dict) -> List[Dict]:
+    """Menjalankan prompt satu per satu (tanpa padding) agar hasilnya sebanding antar backend."""
+    results = []
+    for prompt in prompts:
+        started = time.perf_counter()
+        inputs = tokenizer([prompt], return_tensors="pt", truncation=True)
+        if ml_engine.torch is not None:
+            with ml_engine.torch.no_grad():
+                reply_ids = model.generate(**inputs, **generate_kwargs)
+        else:
+            reply_ids = model.generate(**inputs, **generate_kwargs)
+        reply = tokenizer.batch_decode(reply_ids, skip_special_tokens=True)[0].strip()
+        results.append({"prompt": prompt, "reply": reply, "seconds": time.perf_counter() - started})
+    return results
+
+
+def check_parity(model_name: str, backend: str, prompts: List[str],
+                 generate_kwargs: Optional[Dict] = None) -> Dict:
+    """Membandingkan balasan backend dengan model referensi (decoding greedy, deterministik)."""
+    generate_kwargs = generate_kwargs or {}
+    reference = generate(*ml_engine._load_backend(model_name, "pytorch"), prompts, generate_kwargs)
+    candidate = generate(*ml_engine._load_backend(model_name, backend), prompts, generate_kwargs)
+    rows = []
+    for ref, cand in zip(reference, candidate):
+        rows.append({
+            "prompt": ref["prompt"],
+            "reference": ref["reply"],
+            "candidate": cand["reply"],
+            "exact": ref["reply"] == cand["reply"],
+            "similarity": SequenceMatcher(None, ref["reply"], cand["reply"]).ratio(),
+        })
+    ref_seconds = sum(r["seconds"] for r in reference)
+    cand_seconds = sum(r["seconds"] for r in candidate)
+    return {
+        "model": model_name,
+        "backend": backend,
+        "prompts": len(rows),
+        "exact_match_rate": sum(r["exact"] for r in rows) / len(rows) if rows else 0.0,
+        "mean_similarity": sum(r["similarity"] for r in rows) / len(rows) if rows else 0.0,
+        "reference_seconds": ref_seconds,
+        "candidate_seconds": cand_seconds,
+        "speedup": ref_seconds / cand_seconds if cand_seconds else 0.0,
+        "rows": rows,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Konversi model BlenderBot dan cek paritas keluaran.")
+    parser.add_argument("--backend", required=True, choices=[b for b in MODEL_BACKENDS if b != "pytorch"])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--force", action="store_true", help="konversi ulang walau artefak sudah ada")
+    parser.add_argument("--check-only", action="store_true", help="lewati konversi, hanya cek paritas")
+    parser.add_argument("--skip-check", action="store_true", help="hanya konversi, tanpa cek paritas")
+    parser.add_argument("--prompts", help="file teks berisi satu prompt per baris")
+    parser.add_argument("--min-similarity", type=float, default=0.85)
+    parser.add_argument("--output", help="tulis laporan paritas JSON ke file")
+    args = parser.parse_args(argv)
+
+    if not ml_engine.import_ml_libraries():
+        print("ERROR: Konversi membutuhkan pustaka 'transformers'.", file=sys.stderr)
+        return 1
+    if not args.check_only:
+        path = ml_engine.convert_model(args.model, args.backend, force=args.force)
+        print(f"Artefak: {path}", file=sys.stderr)
+    if args.skip_check:
+        return 0
+
+    prompts = PARITY_PROMPTS
+    if args.prompts:
+        prompts = [line.strip() for line in Path(args.prompts).read_text(encoding="utf-8").splitlines() if line.strip()]
+    report = check_parity(args.model, args.backend, prompts)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    print(f"exact match {report['exact_match_rate']:.0%}, kemiripan {report['mean_similarity']:.3f}, "
+          f"speedup {report['speedup']:.2f}x", file=sys.stderr)
+    return 0 if report["mean_similarity"] >= args.min_similarity else 1
+
+
+if __name__ == "__main__":
+    configure_logging()
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Penyaringan pesan darurat yang berjalan sebelum tahap lain.
+
+Pesan dinormalisasi dulu agar variasi penulisan yang umum tetap tertangkap:
+- huruf kapital dan aksen ("BUNUH DÍRI")
+- leetspeak ("bun0h d1r1", "$elf h4rm")
+- huruf diulang atau tanda baca di dalam kata ("matiii", "bunuh-diri")
+- huruf yang dipisah spasi/titik ("b u n u h d i r i", "b.u.n.u.h")
+- salah ketik satu huruf pada kata keyword ("bunug diri", "sucide")
+
+Semua keyword dan variannya dikompilasi sekali menjadi satu automaton, dan
+penyaring tidak membaca sesi maupun menyentuh model, sehingga biayanya hanya
+beberapa mikrodetik per pesan dan tidak ikut menunggu antrean apa pun.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+from matcher import KeywordAutomaton
+
+_LEET = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "i", "+": "t",
+})
+_LETTERS_RE = re.compile(r"[a-z]+")
+_REPEAT_RE = re.compile(r"(.)\1+")
+
+# Kata keyword sependek ini tidak dikoreksi ejaannya: terlalu banyak kata umum yang
+# berjarak satu huruf darinya ("mau"/"mai", "asa"/"apa").
+MIN_FUZZY_LENGTH = 4
+# Substitusi/transposisi huruf hanya dikoreksi untuk kata sepanjang ini ("diri"/"dari").
+MIN_SUBSTITUTION_LENGTH = 5
+# Huruf tunggal berurutan minimal sebanyak ini digabung menjadi satu kata.
+MIN_SPELLED_RUN = 3
+# Akhiran informal/baku yang membentuk kata biasa dari kata keyword. Setelah huruf
+# ulang dirapatkan, "matiin" (mematikan) menjadi "matin" yang hanya berjarak satu
+# huruf dari "mati"; bentuk seperti ini tidak boleh dikoreksi ke kata dasarnya.
+COMMON_SUFFIXES = ("in", "kan", "nya", "an", "i", "n", "ku", "mu", "lah")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Memecah teks menjadi kata huruf kecil yang sudah dinormalisasi."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    text = text.translate(_LEET)
+    words: List[str] = []
+    spelled: List[str] = []
+    for token in _LETTERS_RE.findall(text):
+        if len(token) == 1:
+            spelled.append(token)
+            continue
+        words.extend(_flush_spelled(spelled))
+        words.append(token)
+    words.extend(_flush_spelled(spelled))
+    return [_REPEAT_RE.sub(r"\1", word) for word in words]
+
+
+def _flush_spelled(spelled: List[str]) -> List[str]:
+    if len(spelled) >= MIN_SPELLED_RUN:
+        words = ["".join(spelled)]
+    else:
+        words = list(spelled)
+    spelled.clear()
+    return words
+
+
+def _deletes(word: str) -> Iterable[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class EmergencyScreener:
+    """
+    Matcher keyword darurat atas teks yang dinormalisasi (lihat docstring modul).
+
+    Setiap keyword didaftarkan dalam bentuk berspasi dan tanpa spasi ("bunuh diri"
+    dan "bunuhdiri"), sehingga ejaan yang dipisah per huruf juga cocok. Koreksi
+    salah ketik memakai tabel deletion satu huruf dari kosakata keyword yang
+    dibangun di awal; kata pesan yang berjarak satu edit dari kata keyword diganti
+    sebelum scan kedua, kecuali bentuk berakhiran dari kata keyword itu sendiri
+    ("matiin", "matikan") yang merupakan kata biasa.
+    """
+
+    def __init__(self, keywords: Iterable[str], variants: Iterable[str] = ()):
+        phrases: List[str] = []
+        vocabulary = set()
+        for keyword in list(keywords) + list(variants):
+            words = normalize_words(keyword)
+            if not words:
+                continue
+            phrases.append(" ".join(words))
+            if len(words) > 1:
+                phrases.append("".join(words))
+            vocabulary.update(word for word in words if len(word) >= MIN_FUZZY_LENGTH)
+        self.automaton = KeywordAutomaton(phrases)
+        self.vocabulary = frozenset(vocabulary)
+        self._inflected = frozenset(
+            inflected
+            for word in vocabulary for suffix in COMMON_SUFFIXES
+            for inflected in (_REPEAT_RE.sub(r"\1", word + suffix),)
+            if inflected not in vocabulary
+        )
+        self._deletes: Dict[str, str] = {}
+        for word in sorted(vocabulary):
+            for deleted in _deletes(word):
+                self._deletes.setdefault(deleted, word)
+
+    @classmethod
+    def from_emergency_data(cls, emergency_data: Dict) -> "EmergencyScreener":
+        """Keyword dan `emergency_variants` (ejaan informal tambahan) dari emergency.json."""
+        return cls(emergency_data.get('emergency_keywords', []), emergency_data.get('emergency_variants', []))
+
+    def __len__(self) -> int:
+        return len(self.automaton.keywords)
+
+    def _correct(self, word: str) -> str:
+        if len(word) < MIN_FUZZY_LENGTH or word in self.vocabulary or word in self._inflected:
+            return word
+        # Satu huruf hilang ("bunh" -> "bunuh").
+        if word in self._deletes:
+            return self._deletes[word]
+        for deleted in sorted(_deletes(word)):
+            # Satu huruf berlebih ("sucuide" -> "suicide").
+            if deleted in self.vocabulary:
+                return deleted
+            # Satu huruf salah ("bunug" -> "bunuh").
+            if len(word) >= MIN_SUBSTITUTION_LENGTH and deleted in self._deletes:
+                candidate = self._deletes[deleted]
+                if len(candidate) == len(word):
+                    return candidate
+        return word
+
+    def match(self, text: str) -> Optional[str]:
+        """Keyword (bentuk ternormalisasi) pertama yang cocok, atau None."""
+        if not text or not self.automaton.keywords:
+            return None
+        words = normalize_words(text)
+        if not words:
+            return None
+        found = self.automaton.find(" ".join(words))
+        if not found:
+            corrected = [self._correct(word) for word in words]
+            if corrected == words:
+                return None
+            found = self.automaton.find(" ".join(corrected))
+            if not found:
+                return None
+        return self.automaton.keywords[min(found)]
+
+    def screen(self, text: str) -> bool:
+        return self.match(text) is not None
+
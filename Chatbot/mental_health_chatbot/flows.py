@@ -0,0 +1,134 @@
+"""
+Flow percakapan terpandu yang dideklarasikan di data/flows.json.
+
+Format setiap flow:
+    "nama_flow": {
+        "description": "...",
+        "steps": [
+            {"template": "Teks dengan {input}", "capture": "nama_variabel", "next": 1},
+            {"template": "Teks penutup {data.nama_variabel}"}
+        ]
+    }
+
+- `template`: teks balasan. Field yang dikenal: {input} (pesan pengguna),
+  {data.<nama>} (variabel yang ditangkap step sebelumnya), dan
+  {knowledge.<topik>.<field>} (dibaca dari knowledge_base.json saat dirender).
+- `capture`: jika ada, pesan pengguna disimpan ke context.data[<capture>].
+- `next`: indeks step berikutnya; default step setelahnya. `null` atau step
+  terakhir mengakhiri flow (konteks di-reset).
+
+Flow dikompilasi sekali saat data dimuat menjadi tabel step dengan template yang
+sudah dipecah menjadi potongan literal dan field, sehingga merender satu step hanya
+berupa satu join string.
+"""
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, Optional, Tuple
+
+MISSING_KNOWLEDGE = 'Informasi tidak ditemukan.'
+
+# Sumber nilai field template.
+FIELD_INPUT = 0
+FIELD_DATA = 1
+FIELD_KNOWLEDGE = 2
+
+
+class FlowError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class FlowStep:
+    # Potongan template: string literal, atau tuple (sumber, path) untuk field.
+    parts: Tuple
+    capture: Optional[str]
+    next_step: Optional[int]  # None = flow selesai
+    text: Optional[str]  # hasil render tetap jika template tanpa field
+    uses_knowledge: bool
+
+    def render(self, user_input: str, data: Dict, knowledge_base: Optional[Dict]) -> str:
+        if self.text is not None:
+            return self.text
+        return "".join([
+            part if part.__class__ is str else _resolve(part, user_input, data, knowledge_base)
+            for part in self.parts
+        ])
+
+
+@dataclass(frozen=True)
+class FlowDefinition:
+    name: str
+    steps: Tuple[FlowStep, ...]
+    description: str = "A guided conversation flow."
+
+
+def _resolve(field: Tuple, user_input: str, data: Dict, knowledge_base: Optional[Dict]) -> str:
+    source, path = field
+    if source == FIELD_INPUT:
+        return user_input
+    if source == FIELD_DATA:
+        return str(data.get(path, ''))
+    topic, key = path
+    return str(knowledge_base.get(topic, {}).get(key, MISSING_KNOWLEDGE))
+
+
+def _compile_field(flow: str, name: str) -> Tuple:
+    parts = name.split('.')
+    if parts == ['input']:
+        return (FIELD_INPUT, None)
+    if len(parts) == 2 and parts[0] == 'data':
+        return (FIELD_DATA, parts[1])
+    if len(parts) == 3 and parts[0] == 'knowledge':
+        return (FIELD_KNOWLEDGE, (parts[1], parts[2]))
+    raise FlowError(f"Field template tidak dikenal di flow '{flow}': {{{name}}}")
+
+
+def compile_template(flow: str, template: str) -> Tuple:
+    parts = []
+    try:
+        parsed = list(Formatter().parse(template))
+    except ValueError as e:
+        raise FlowError(f"Template flow '{flow}' tidak valid: {e}")
+    for literal, field_name, format_spec, conversion in parsed:
+        if literal:
+            parts.append(literal)
+        if field_name is None:
+            continue
+        if format_spec or conversion:
+            raise FlowError(f"Format spec tidak didukung di flow '{flow}': {{{field_name}}}")
+        parts.append(_compile_field(flow, field_name))
+    # Potongan literal yang berdampingan digabung agar render sesedikit mungkin join.
+    merged = []
+    for part in parts:
+        if merged and isinstance(part, str) and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return tuple(merged) or ("",)
+
+
+def compile_flows(raw: Dict) -> Dict[str, FlowDefinition]:
+    """Mengubah isi flows.json menjadi tabel FlowDefinition; melempar FlowError jika tidak valid."""
+    flows = {}
+    for name, spec in raw.items():
+        steps_spec = spec.get('steps', [])
+        if not steps_spec:
+            raise FlowError(f"Flow '{name}' tidak memiliki step.")
+        steps = []
+        for index, step in enumerate(steps_spec):
+            default_next = index + 1 if index + 1 < len(steps_spec) else None
+            next_step = step.get('next', default_next)
+            if next_step is not None and not 0 <= next_step < len(steps_spec):
+                raise FlowError(f"Transisi tidak valid di flow '{name}' step {index}: {next_step}")
+            parts = compile_template(name, step.get('template', ''))
+            static = len(parts) == 1 and isinstance(parts[0], str)
+            steps.append(FlowStep(
+                parts=parts,
+                capture=step.get('capture'),
+                next_step=next_step,
+                text=parts[0] if static else None,
+                uses_knowledge=any(not isinstance(p, str) and p[0] == FIELD_KNOWLEDGE for p in parts),
+            ))
+        flows[name.lower()] = FlowDefinition(name.lower(), tuple(steps),
+                                             spec.get('description', FlowDefinition.description))
+    return flows
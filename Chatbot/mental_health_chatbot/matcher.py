@@ -0,0 +1,143 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    # Sama dengan definisi `\w` pada modul `re` untuk string unicode.
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordAutomaton:
+    """
+    Automaton Aho-Corasick untuk mencari banyak keyword sekaligus dalam satu kali scan.
+
+    Setiap kemunculan diverifikasi dengan aturan batas kata yang sama seperti
+    `re.search(r'\\b' + re.escape(kw) + r'\\b', text)`, sehingga hasilnya identik
+    dengan pencarian regex per keyword. Kemunculan yang saling tumpang tindih
+    (mis. "borderline" di dalam "borderline personality disorder") tetap terdeteksi.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        index: Dict[str, int] = {}
+        for kw in keywords:
+            if not kw or kw in index:
+                continue
+            index[kw] = len(self.keywords)
+            self.keywords.append(kw)
+            self._insert(kw, index[kw])
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, keyword_id: int) -> None:
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (keyword_id,)
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[int]:
+        """Mengembalikan id semua keyword yang muncul sebagai kata utuh di `text`."""
+        found: Set[int] = set()
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        last = len(text) - 1
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for kid in out[state]:
+                if kid in found:
+                    continue
+                kw = keywords[kid]
+                start = i - len(kw) + 1
+                before = start > 0 and _is_word_char(text[start - 1])
+                after = i < last and _is_word_char(text[i + 1])
+                if before != _is_word_char(kw[0]) and after != _is_word_char(kw[-1]):
+                    found.add(kid)
+        return found
+
+
+@dataclass
+class MatchResult:
+    """Semua hasil pencocokan keyword untuk satu pesan."""
+    topic_scores: Dict[str, int] = field(default_factory=dict)
+    qa_intent: Optional[str] = None
+    emergency: bool = False
+
+    @property
+    def best_topic(self) -> Optional[str]:
+        # max() mengembalikan topik pertama saat skor seri, sama seperti logika lama.
+        return max(self.topic_scores, key=self.topic_scores.get) if self.topic_scores else None
+
+
+class MessageMatcher:
+    """
+    Mesin pencocokan yang dibangun sekali saat data dimuat, menggabungkan keyword
+    topik, pola Q&A, dan keyword darurat ke dalam satu automaton.
+    """
+
+    def __init__(self, topic_keywords: Dict[str, List[str]], qa_pairs: Dict[str, Dict],
+                 emergency_keywords: List[str]):
+        # Setiap keyword bisa dimiliki beberapa grup; payload disimpan per keyword.
+        payloads: Dict[str, List[Tuple[str, object]]] = {}
+        for topic, keywords in topic_keywords.items():
+            for kw in keywords:
+                payloads.setdefault(kw, []).append(("topic", topic))
+        self._qa_order: Dict[str, int] = {}
+        for order, (intent, data) in enumerate(qa_pairs.items()):
+            self._qa_order[intent] = order
+            for pattern in data.get('patterns', []):
+                payloads.setdefault(pattern, []).append(("qa", intent))
+        for kw in emergency_keywords:
+            payloads.setdefault(kw, []).append(("emergency", None))
+
+        self._topics = list(topic_keywords)
+        self._automaton = KeywordAutomaton(payloads)
+        self._payloads = [payloads[kw] for kw in self._automaton.keywords]
+
+    def scan(self, text_lower: str) -> MatchResult:
+        """Satu kali scan atas teks yang sudah di-lowercase."""
+        result = MatchResult()
+        if not text_lower:
+            return result
+        scores: Dict[str, int] = {}
+        qa_intent, qa_rank = None, len(self._qa_order)
+        for kid in self._automaton.find(text_lower):
+            for kind, label in self._payloads[kid]:
+                if kind == "topic":
+                    scores[label] = scores.get(label, 0) + 1
+                elif kind == "qa":
+                    if self._qa_order[label] < qa_rank:
+                        qa_intent, qa_rank = label, self._qa_order[label]
+                else:
+                    result.emergency = True
+        # Urutan topik mengikuti topic_keywords agar penentuan skor seri tetap sama.
+        result.topic_scores = {t: scores[t] for t in self._topics if t in scores}
+        result.qa_intent = qa_intent
+        return result
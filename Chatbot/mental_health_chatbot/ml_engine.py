@@ -0,0 +1,571 @@
+import gc
+import os
+import importlib.util
+import time
+import shutil
+import queue
+import logging
+import weakref
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses.
+    fcntl = None
+
+from metrics import REGISTRY
+from startup import STARTUP
+
+# Import transformers/torch butuh beberapa detik dan ratusan MB, jadi ditunda sampai
+# model benar-benar dimuat (lihat `import_ml_libraries`). Worker rule-based saja
+# tidak pernah mengimpornya; keberadaan paket dicek tanpa mengeksekusinya.
+HAS_TRANSFORMERS = importlib.util.find_spec("transformers") is not None
+BlenderbotTokenizer = BlenderbotForConditionalGeneration = TextIteratorStreamer = StoppingCriteriaList = None
+torch = None
+_IMPORT_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+MODEL_PHASE_SECONDS = REGISTRY.histogram(
+    "chatbot_model_phase_seconds", "Waktu tokenize/generate/decode model per batch.", ["phase"])
+BATCH_SIZE = REGISTRY.histogram(
+    "chatbot_inference_batch_size", "Jumlah prompt per panggilan generate.", buckets=(1, 2, 4, 8, 16, 32, 64))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "chatbot_inference_queue_wait_seconds", "Waktu tunggu prompt di antrean inferensi.")
+INFERENCE_REJECTED = REGISTRY.counter(
+    "chatbot_inference_rejected_total", "Prompt yang ditolak karena antrean inferensi penuh.")
+
+MODEL_NAME = "facebook/blenderbot_small-90M"
+
+# Mode pemuatan model:
+# - eager: dimuat sinkron saat inisialisasi (perilaku lama; dipakai untuk pre-fork).
+# - background: thread memuat model sementara jawaban rule-based sudah dilayani.
+# - lazy: pemuatan baru dimulai (di background) saat fallback AI pertama kali dibutuhkan.
+# - disabled: model tidak pernah dimuat.
+MODEL_MODES = ("eager", "background", "lazy", "disabled")
+
+# Backend inferensi:
+# - pytorch: model float32 asli (referensi).
+# - int8: kuantisasi dinamis int8 pada lapisan Linear; lebih kecil dan lebih cepat di CPU.
+# - onnx: model hasil ekspor ONNX Runtime (paket `optimum[onnxruntime]`) dengan KV-cache.
+# Backend selain pytorch dikonversi sekali lalu disimpan di MODEL_CACHE_DIR
+# (lihat convert_model.py); jika belum ada, konversi dijalankan saat pemuatan pertama.
+MODEL_BACKENDS = ("pytorch", "int8", "onnx")
+MODEL_CACHE_DIR = Path(os.environ.get("CHATBOT_MODEL_CACHE", Path(__file__).parent / "model_cache"))
+
+# Model yang dimuat di proses induk sebelum fork. Worker hasil fork memakai objek
+# yang sama sehingga bobot model dibagi secara copy-on-write.
+_SHARED_MODELS: Dict[Tuple[str, str], Tuple[object, object]] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def _reset_locks_after_fork() -> None:
+    # Lock modul bisa sedang dipegang thread pemuat induk saat fork (gunicorn --preload).
+    global _IMPORT_LOCK, _SHARED_LOCK
+    _IMPORT_LOCK = threading.Lock()
+    _SHARED_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def import_ml_libraries() -> bool:
+    """Mengimpor transformers (dan torch jika ada) sekali; False jika transformers tidak terpasang."""
+    global BlenderbotTokenizer, BlenderbotForConditionalGeneration, TextIteratorStreamer, StoppingCriteriaList, torch
+    with _IMPORT_LOCK:
+        if BlenderbotTokenizer is None and HAS_TRANSFORMERS:
+            with STARTUP.phase("import torch"):
+                try:
+                    import torch
+                except ImportError:
+                    torch = None
+            with STARTUP.phase("import transformers"):
+                from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
+                try:
+                    from transformers import StoppingCriteriaList, TextIteratorStreamer
+                except ImportError:
+                    StoppingCriteriaList = TextIteratorStreamer = None
+    return BlenderbotTokenizer is not None
+
+
+def artifact_dir(model_name: str, backend: str, cache_dir: Optional[Path] = None) -> Path:
+    return Path(cache_dir or MODEL_CACHE_DIR) / f"{model_name.replace('/', '--')}-{backend}"
+
+
+def _load_reference(model_name: str) -> Tuple[object, object]:
+    tokenizer = BlenderbotTokenizer.from_pretrained(model_name)
+    model = BlenderbotForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    return tokenizer, model
+
+
+def _import_ort_model():
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("Backend 'onnx' membutuhkan `pip install optimum[onnxruntime]`.")
+    return ORTModelForSeq2SeqLM
+
+
+@contextmanager
+def _conversion_lock(target: Path) -> Iterator[None]:
+    """Lock file antar proses agar hanya satu worker yang mengonversi `target`."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target.with_name(target.name + ".lock"), "w") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def convert_model(model_name: str, backend: str, cache_dir: Optional[Path] = None,
+                  force: bool = False) -> Path:
+    """Mengonversi model referensi ke `backend` dan menyimpan artefaknya di disk."""
+    if backend not in MODEL_BACKENDS or backend == "pytorch":
+        raise ValueError(f"Backend '{backend}' tidak perlu/dapat dikonversi.")
+    if not import_ml_libraries():
+        raise RuntimeError("Konversi model membutuhkan pustaka 'transformers'.")
+    target = artifact_dir(model_name, backend, cache_dir)
+    if target.exists() and not force:
+        return target
+    with _conversion_lock(target):
+        # Worker lain bisa saja selesai mengonversi selama kita menunggu lock.
+        if target.exists() and not force:
+            return target
+        logger.info(f"Mengonversi model '{model_name}' ke backend '{backend}'...")
+        # Artefak ditulis ke direktori sementara lalu di-rename, agar worker lain
+        # tidak pernah melihat hasil konversi yang setengah jadi.
+        staging = target.with_name(target.name + f".tmp{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        try:
+            _write_artifacts(model_name, backend, staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if force:
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            staging.rename(target)
+        except OSError:
+            # Target dibuat proses lain (mis. tanpa fcntl): pakai yang sudah ada.
+            shutil.rmtree(staging, ignore_errors=True)
+            if not target.exists():
+                raise
+    logger.info(f"Artefak backend '{backend}' disimpan di {target}")
+    return target
+
+
+def _write_artifacts(model_name: str, backend: str, staging: Path) -> None:
+    if backend == "int8":
+        if torch is None:
+            raise RuntimeError("Backend 'int8' membutuhkan PyTorch.")
+        tokenizer, model = _load_reference(model_name)
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        tokenizer.save_pretrained(staging)
+        # Modul utuh disimpan agar pemuatan berikutnya tidak perlu bobot float32 sama sekali.
+        torch.save(quantized, staging / "model.pt")
+    else:
+        ort_model = _import_ort_model().from_pretrained(model_name, export=True, use_cache=True)
+        ort_model.save_pretrained(staging)
+        BlenderbotTokenizer.from_pretrained(model_name).save_pretrained(staging)
+
+
+def _load_backend(model_name: str, backend: str) -> Tuple[object, object]:
+    if not import_ml_libraries():
+        raise RuntimeError("Pustaka 'transformers' tidak terpasang.")
+    if backend == "pytorch":
+        return _load_reference(model_name)
+    path = convert_model(model_name, backend)
+    tokenizer = BlenderbotTokenizer.from_pretrained(path)
+    if backend == "int8":
+        model = torch.load(path / "model.pt", weights_only=False)
+        model.eval()
+    else:
+        model = _import_ort_model().from_pretrained(path, use_cache=True)
+    return tokenizer, model
+
+
+def _load_pretrained(model_name: str, backend: str = "pytorch") -> Tuple[object, object]:
+    key = (model_name, backend)
+    with _SHARED_LOCK:
+        if key in _SHARED_MODELS:
+            logger.info(f"Memakai model '{model_name}' ({backend}) yang sudah dimuat di proses ini.")
+            return _SHARED_MODELS[key]
+    logger.info(f"Mencoba memuat model AI BlenderBot ({backend}, mungkin butuh waktu saat pertama kali)...")
+    loaded = _load_backend(model_name, backend)
+    with _SHARED_LOCK:
+        return _SHARED_MODELS.setdefault(key, loaded)
+
+
+def preload_shared_model(model_name: str = MODEL_NAME, backend: str = "pytorch") -> bool:
+    """
+    Memuat model sekali di proses induk (mis. hook `on_starting` gunicorn atau
+    `gunicorn --preload` dengan CHATBOT_MODEL_MODE=eager). Setelah dimuat, objek
+    dibekukan dari GC agar worker hasil fork tidak menyalin halaman memori bobot.
+    """
+    if not HAS_TRANSFORMERS:
+        logger.warning("Tidak bisa memuat model AI karena pustaka 'transformers' tidak ada.")
+        return False
+    try:
+        _load_pretrained(model_name, backend)
+    except Exception as e:
+        logger.error(f"Gagal memuat model AI: {e}")
+        return False
+    gc.freeze()
+    return True
+
+
+class ModelLoader:
+    """Mengelola siklus hidup model fallback tanpa pernah memblokir request."""
+
+    def __init__(self, model_name: str = MODEL_NAME, mode: str = "background", backend: str = "pytorch"):
+        if mode not in MODEL_MODES:
+            raise ValueError(f"Mode model tidak dikenal: '{mode}'. Pilihan: {', '.join(MODEL_MODES)}")
+        if backend not in MODEL_BACKENDS:
+            raise ValueError(f"Backend model tidak dikenal: '{backend}'. Pilihan: {', '.join(MODEL_BACKENDS)}")
+        self.model_name = model_name
+        self.mode = mode
+        self.backend = backend
+        self.state = "idle"  # idle -> loading -> ready | failed; atau disabled
+        self.tokenizer = None
+        self.model = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: (loader := ref()) is not None and loader._after_fork())
+
+    def _after_fork(self) -> None:
+        """
+        Thread pemuat tidak ikut ter-fork: jika fork terjadi di tengah pemuatan,
+        worker anak mengklaim ulang pemuatan alih-alih menunggu "loading" selamanya.
+        """
+        ready = self._ready.is_set()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        if ready:
+            self._ready.set()
+        if self.state == "loading":
+            self.state = "idle"
+            if self.mode != "lazy":
+                self.ensure_loading()
+
+    @property
+    def ready(self) -> bool:
+        """Flag kesiapan; aman dicek di jalur request karena tidak pernah menunggu."""
+        return self._ready.is_set()
+
+    @property
+    def model_id(self) -> str:
+        """Nama model beserta backend-nya; keluaran tiap backend bisa sedikit berbeda."""
+        return self.model_name if self.backend == "pytorch" else f"{self.model_name}@{self.backend}"
+
+    def start(self) -> None:
+        if self.mode == "disabled" or not HAS_TRANSFORMERS:
+            if not HAS_TRANSFORMERS:
+                logger.warning("Tidak bisa memuat model AI karena pustaka 'transformers' tidak ada. "
+                               "Bot akan berjalan dalam mode rule-based saja.")
+            self.state = "disabled"
+        elif self.mode == "eager":
+            if self._claim():
+                self._load()
+        elif self.mode == "background":
+            self.ensure_loading()
+
+    def ensure_loading(self) -> None:
+        """Memulai pemuatan di background jika belum pernah dimulai."""
+        if self._claim():
+            threading.Thread(target=self._load, name="model-loader", daemon=True).start()
+
+    def use(self, tokenizer, model) -> None:
+        """Memasang tokenizer/model yang sudah ada (mis. model stub untuk benchmark)."""
+        with self._lock:
+            self.tokenizer, self.model = tokenizer, model
+            self.state = "ready"
+            self._ready.set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self.state != "idle":
+                return False
+            self.state = "loading"
+            return True
+
+    def _load(self) -> None:
+        try:
+            with STARTUP.phase(f"load model {self.backend}"):
+                self.tokenizer, self.model = _load_pretrained(self.model_name, self.backend)
+            self.state = "ready"
+            self._ready.set()
+            logger.info(f"Model AI BlenderBot berhasil dimuat (backend {self.backend}).")
+        except Exception as e:
+            logger.error(f"Gagal memuat model AI: {e}")
+            logger.warning("Chatbot akan berjalan dalam mode rule-based saja.")
+            self.tokenizer, self.model = None, None
+            self.state = "failed"
+
+
+class _StopWhenSet:
+    """Stopping criteria generate: berhenti begitu pembaca stream sudah pergi."""
+
+    def __init__(self, stop: threading.Event):
+        self.stop = stop
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stopped = self.stop.is_set()
+        if torch is not None:
+            return torch.full((input_ids.shape[0],), stopped, dtype=torch.bool, device=input_ids.device)
+        return stopped
+
+
+QueueItem = Tuple[str, Future, float, Optional[Tuple[object, threading.Event]]]
+
+
+class InferenceBatcher:
+    """
+    Worker inferensi tunggal yang menggabungkan prompt fallback dari banyak request.
+
+    Prompt dikumpulkan selama paling lama `max_wait_ms` atau sampai `max_batch_size`,
+    lalu di-padding menjadi satu panggilan `generate`. Request yang menunggu menerima
+    hasilnya lewat Future masing-masing. Jika antrean penuh, `submit` gagal seketika
+    agar request bisa langsung turun ke fallback rule-based.
+    """
+
+    def __init__(self, loader: ModelLoader, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 max_queue: int = 64, num_threads: Optional[int] = None,
+                 generate_kwargs: Optional[Dict] = None):
+        self.loader = loader
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.generate_kwargs = generate_kwargs or {}
+        # Item antrean: (prompt, future, waktu masuk, (streamer, event stop) atau None).
+        self._queue: "queue.Queue[QueueItem]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "prompts": 0,
+            "rejected": 0,
+            "errors": 0,
+            "last_batch_size": 0,
+            "max_batch_size_seen": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "generate_seconds_total": 0.0,
+        }
+        if hasattr(os, "register_at_fork"):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: (batcher := ref()) is not None and batcher._after_fork())
+
+    def _after_fork(self) -> None:
+        # Worker induk tidak ikut ter-fork, tetapi kondisi antrean masih mencatatnya
+        # sebagai penunggu; antrean dan lock dibuat ulang dan worker dimulai lagi saat perlu.
+        # Prompt yang tersisa milik request di proses induk.
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def submit(self, text: str, stream: Optional[Tuple[object, threading.Event]] = None) -> Future:
+        """
+        Memasukkan prompt ke antrean; melempar queue.Full jika antrean penuh.
+        `stream` berisi (streamer, event stop) untuk prompt yang dikirim per token.
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((text, future, time.perf_counter(), stream))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            INFERENCE_REJECTED.inc()
+            raise
+        return future
+
+    def generate(self, text: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Versi sinkron: menunggu hasil batch; None jika antrean penuh atau timeout."""
+        try:
+            future = self.submit(text)
+        except queue.Full:
+            logger.warning("Antrean inferensi penuh, memakai fallback rule-based.")
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Prompt yang belum diambil worker dibuang dari batch berikutnya.
+            future.cancel()
+            logger.warning(f"Inferensi melebihi batas waktu {timeout} detik.")
+        return None
+
+    def stream(self, text: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Menghasilkan balasan token demi token untuk satu prompt. Prompt streaming
+        melewati antrean dan worker yang sama dengan `generate` (jadi ikut dibatasi
+        `max_queue` dan jumlah thread torch), tetapi dijalankan sendiri-sendiri karena
+        setiap klien butuh urutan tokennya sendiri. `timeout` adalah batas waktu tunggu
+        per token. Jika pembaca berhenti (timeout atau klien putus), generate dihentikan
+        lewat stopping criteria. Tanpa TextIteratorStreamer, balasan utuh dari jalur
+        batch dikirim sebagai satu potongan.
+        """
+        tokenizer = self.loader.tokenizer
+        if TextIteratorStreamer is None or not callable(getattr(tokenizer, "decode", None)):
+            reply = self.generate(text, timeout=timeout)
+            if reply:
+                yield reply
+            return
+
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        stop = threading.Event()
+        try:
+            future = self.submit(text, stream=(streamer, stop))
+        except queue.Full:
+            logger.warning("Antrean inferensi penuh, memakai fallback rule-based.")
+            return
+
+        started = time.perf_counter()
+        first = True
+        try:
+            for chunk in streamer:
+                if first:
+                    MODEL_PHASE_SECONDS.labels("first_token").observe(time.perf_counter() - started)
+                    first = False
+                if chunk:
+                    yield chunk
+        except queue.Empty:
+            logger.warning(f"Streaming melebihi batas waktu {timeout} detik per token.")
+            return
+        finally:
+            # Generate yang tidak lagi dibaca (atau belum mulai) dihentikan.
+            stop.set()
+            future.cancel()
+        MODEL_PHASE_SECONDS.labels("stream").observe(time.perf_counter() - started)
+        if future.done() and not future.cancelled() and future.exception() is not None:
+            raise future.exception()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.queue_depth()
+        stats["avg_batch_size"] = stats["prompts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self) -> List[QueueItem]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        if torch is not None:
+            torch.set_num_threads(self.num_threads)
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            waits = [started - enqueued for _, _, enqueued, _ in batch]
+            BATCH_SIZE.observe(len(batch))
+            for wait in waits:
+                QUEUE_WAIT_SECONDS.observe(wait)
+            # Future yang sudah dibatalkan pemanggilnya tidak perlu diproses.
+            live = [(text, future, stream) for text, future, _, stream in batch
+                    if future.set_running_or_notify_cancel()]
+            for text, future, stream in live:
+                if stream is not None:
+                    self._run_stream(text, future, *stream)
+            live = [(text, future) for text, future, stream in live if stream is None]
+            if live:
+                try:
+                    replies = self._generate_batch([text for text, _ in live])
+                    for (_, future), reply in zip(live, replies):
+                        future.set_result(reply)
+                except Exception as e:
+                    logger.error(f"Error saat menghasilkan respons dari model AI: {e}")
+                    with self._stats_lock:
+                        self._stats["errors"] += 1
+                    for _, future in live:
+                        future.set_exception(e)
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["prompts"] += len(batch)
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], len(batch))
+                self._stats["wait_seconds_total"] += sum(waits)
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], max(waits))
+                self._stats["generate_seconds_total"] += time.perf_counter() - started
+
+    def _run_stream(self, text: str, future: Future, streamer, stop: threading.Event) -> None:
+        tokenizer, model = self.loader.tokenizer, self.loader.model
+        if stop.is_set():
+            streamer.end()
+            future.set_result(None)
+            return
+        try:
+            inputs = tokenizer([text], return_tensors="pt", truncation=True)
+            stopping = [_StopWhenSet(stop)]
+            if StoppingCriteriaList is not None:
+                stopping = StoppingCriteriaList(stopping)
+            kwargs = dict(self.generate_kwargs, streamer=streamer, stopping_criteria=stopping)
+            if torch is not None:
+                with torch.no_grad():
+                    model.generate(**inputs, **kwargs)
+            else:
+                model.generate(**inputs, **kwargs)
+            future.set_result(None)
+        except Exception as e:
+            logger.error(f"Error saat streaming respons dari model AI: {e}")
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            streamer.end()
+            future.set_exception(e)
+
+    def _generate_batch(self, texts: List[str]) -> List[str]:
+        tokenizer, model = self.loader.tokenizer, self.loader.model
+        t = time.perf_counter()
+        inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        t = self._observe_phase("tokenize", t)
+        if torch is not None:
+            with torch.no_grad():
+                reply_ids = model.generate(**inputs, **self.generate_kwargs)
+        else:
+            reply_ids = model.generate(**inputs, **self.generate_kwargs)
+        t = self._observe_phase("generate", t)
+        replies = [reply.strip() for reply in tokenizer.batch_decode(reply_ids, skip_special_tokens=True)]
+        self._observe_phase("decode", t)
+        return replies
+
+    @staticmethod
+    def _observe_phase(phase: str, started: float) -> float:
+        now = time.perf_counter()
+        MODEL_PHASE_SECONDS.labels(phase).observe(now - started)
+        return now
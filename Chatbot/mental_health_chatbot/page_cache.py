@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Callable, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    gzip_etag: str  # ETag kuat harus berbeda per content-coding (RFC 9110 §8.8.3)
+    last_modified: str  # format tanggal HTTP
+    last_modified_ts: float
+
+
+class RenderedPageCache:
+    """
+    Menyimpan hasil render sebuah halaman beserta versi gzip, ETag, dan Last-Modified.
+
+    `version()` mengembalikan (kunci_versi, waktu_modifikasi) dari data sumber; halaman
+    hanya dirender ulang saat kunci versinya berubah. Pemanggilan `version()` harus
+    murah (tanpa I/O), misalnya membaca nomor versi snapshot content store.
+    """
+
+    def __init__(self, render: Callable[[], str], version: Callable[[], Tuple[Hashable, float]]):
+        self._render = render
+        self._version = version
+        self._page: Optional[CachedPage] = None
+        self._page_version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def get(self) -> CachedPage:
+        key, modified = self._version()
+        page = self._page
+        if page is not None and key == self._page_version:
+            return page
+        with self._lock:
+            if self._page is None or key != self._page_version:
+                self._page = self._build(modified)
+                self._page_version = key
+            return self._page
+
+    def _build(self, modified: float) -> CachedPage:
+        body = self._render().encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        self.renders += 1
+        last_modified_ts = int(modified)
+        logger.info(f"Halaman dirender ulang ({len(body)} byte).")
+        return CachedPage(
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=6, mtime=0),
+            etag=etag,
+            gzip_etag=f"{etag}-gz",
+            last_modified=formatdate(last_modified_ts, usegmt=True),
+            last_modified_ts=last_modified_ts,
+        )
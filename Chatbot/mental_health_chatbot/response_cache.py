@@ -0,0 +1,150 @@
+import re
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r'[^\w\s]|_')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, buang tanda baca, dan rapatkan spasi: 'Halo,  Apa kabar?' -> 'halo apa kabar'."""
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text.lower())).strip()
+
+
+class ResponseCache:
+    """
+    Cache LRU + TTL untuk balasan model, dengan kunci teks ternormalisasi dan
+    parameter generasi. Jika `persist_path` diisi, entri juga ditulis ke SQLite
+    lokal dan dimuat ulang saat start sehingga cache tetap hangat setelah restart.
+
+    Penulisan ke disk dilakukan thread writer (dengan koneksinya sendiri) secara
+    batch, sehingga `put` tidak pernah menunggu commit SQLite; tabel dipangkas ke
+    `max_entries` entri terbaru setiap batch.
+    """
+
+    # Entri yang belum ditulis; jika penuh, entri baru hanya disimpan di memori.
+    WRITE_QUEUE_SIZE = 1024
+    WRITE_BATCH_SIZE = 256
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 7 * 24 * 3600,
+                 persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (reply, created_wall_time)
+        self._lock = threading.Lock()
+        self.persist_path: Optional[str] = None
+        self._pending: "queue.Queue[tuple]" = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        if persist_path:
+            self._open_store(persist_path)
+
+    @staticmethod
+    def make_key(text: str, params: Optional[Dict] = None) -> str:
+        return normalize_text(text) + "\x1f" + json.dumps(params or {}, sort_keys=True, default=str)
+
+    def get(self, text: str, params: Optional[Dict] = None) -> Optional[str]:
+        key = self.make_key(text, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, reply: str, params: Optional[Dict] = None) -> None:
+        key = self.make_key(text, params)
+        created = time.time()
+        with self._lock:
+            self._entries[key] = (reply, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.persist_path:
+            self._ensure_writer()
+            try:
+                self._pending.put_nowait((key, reply, created))
+            except queue.Full:
+                logger.warning("Antrean tulis cache respons penuh; entri hanya disimpan di memori.")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _open_store(self, path: str) -> None:
+        try:
+            db = sqlite3.connect(path)
+            try:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, reply TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                cutoff = time.time() - self.ttl_seconds
+                db.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+                db.commit()
+                rows = db.execute(
+                    "SELECT key, reply, created FROM responses ORDER BY created DESC LIMIT ?", (self.max_entries,)
+                ).fetchall()
+            finally:
+                db.close()
+            # Dimasukkan dari yang terlama agar urutan LRU sesuai waktu pembuatan.
+            for key, reply, created in reversed(rows):
+                self._entries[key] = (reply, created)
+            self.persist_path = path
+            logger.info(f"Cache respons dimuat dari {path}: {len(rows)} entri.")
+        except sqlite3.Error as e:
+            logger.error(f"Gagal membuka cache respons di {path}: {e}")
+
+    def _ensure_writer(self) -> None:
+        # Dicek ulang setiap put: thread tidak ikut ter-fork (gunicorn --preload).
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="response-cache-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        try:
+            db = sqlite3.connect(self.persist_path)
+        except sqlite3.Error as e:
+            logger.error(f"Gagal membuka cache respons di {self.persist_path}: {e}")
+            self.persist_path = None
+            return
+        while True:
+            rows = [self._pending.get()]
+            while len(rows) < self.WRITE_BATCH_SIZE:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", rows)
+                    db.execute(
+                        "DELETE FROM responses WHERE key NOT IN "
+                        "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)", (self.max_entries,)
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Gagal menyimpan cache respons ke disk: {e}")
@@ -0,0 +1,185 @@
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Panjang n-gram karakter; teks dipadding spasi agar awal/akhir kata ikut terwakili.
+NGRAM = 3
+# Dokumen sampai MAX_WINDOW kata (keyword, pattern Q&A, judul) dicocokkan dengan
+# jendela query yang jumlah katanya sama. Dokumen yang lebih panjang (definisi,
+# deskripsi saran) dicocokkan dengan seluruh pesan.
+MAX_WINDOW = 4
+LONG = 0
+# Jendela dan dokumen frasa harus sepanjang minimal rasio ini satu sama lain, agar
+# kata pendek ("kak") tidak dianggap mirip dengan kata yang memuatnya ("kakak").
+MIN_LENGTH_RATIO = 0.7
+DEFAULT_THRESHOLD = 0.55
+# Intent Q&A yang tidak pernah ditebak lewat kemiripan: balasan positif untuk kata
+# yang hanya mirip ("tenang" -> "senang") justru menyakitkan bagi pengguna yang cemas.
+EXACT_ONLY_INTENTS = frozenset({"tanggapan_positif"})
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def char_ngrams(text: str, n: int = NGRAM) -> List[str]:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+@dataclass(frozen=True)
+class RetrievalDoc:
+    kind: str  # "qa" (intent), "topic" (flow terpandu), atau "knowledge" (entri knowledge_base)
+    key: str
+    text: str
+
+
+@dataclass(frozen=True)
+class RetrievalHit:
+    kind: str
+    key: str
+    score: float
+    text: str
+
+
+class RetrievalIndex:
+    """
+    Indeks TF-IDF n-gram karakter untuk menangkap pesan yang tidak memuat keyword
+    persis, misalnya salah ketik atau bahasa informal ("strees", "overthingking").
+
+    Matriks dokumen disimpan sebagai inverted index (n-gram -> [(doc, bobot)]) dengan
+    vektor dokumen ternormalisasi L2, dipisah per jumlah kata dokumen. Setiap jendela
+    kata pada query hanya dibandingkan dengan dokumen sepanjang jendela itu, sehingga
+    satu kata umum di kalimat panjang tidak "menang" atas pattern yang lebih panjang.
+
+    Untuk dokumen satu kata, n-gram awal kata juga harus sama: salah ketik hampir
+    selalu mempertahankan huruf pertama ("strees", "insomia"), sedangkan kata lain
+    yang kebetulan mirip biasanya tidak ("tenang" vs "senang").
+    """
+
+    def __init__(self, docs: Iterable[RetrievalDoc]):
+        self.docs: List[RetrievalDoc] = []
+        doc_words: List[List[str]] = []
+        seen = set()
+        for doc in docs:
+            words = tokenize(doc.text)
+            variants = [words]
+            if 1 < len(words) <= MAX_WINDOW:
+                # Varian tanpa spasi menangkap penulisan digabung ("terimakasih", "selfcare").
+                variants.append(["".join(words)])
+            for variant in variants:
+                text = " ".join(variant)
+                if text and (doc.kind, doc.key, text) not in seen:
+                    seen.add((doc.kind, doc.key, text))
+                    self.docs.append(RetrievalDoc(doc.kind, doc.key, text))
+                    doc_words.append(variant)
+
+        self._lengths = [len(d.text) for d in self.docs]
+        self._initials = [char_ngrams(d.text)[0] if len(words) == 1 else None
+                          for d, words in zip(self.docs, doc_words)]
+        doc_grams = [Counter(char_ngrams(d.text)) for d in self.docs]
+        df = Counter(g for grams in doc_grams for g in grams)
+        total = len(self.docs)
+        self.idf: Dict[str, float] = {g: math.log((1 + total) / (1 + n)) + 1.0 for g, n in df.items()}
+        # Bobot n-gram yang tidak dikenal indeks: dianggap paling langka.
+        self.unknown_idf = math.log(1 + total) + 1.0
+
+        postings: Dict[int, Dict[str, List[Tuple[int, float]]]] = defaultdict(lambda: defaultdict(list))
+        for doc_id, (words, grams) in enumerate(zip(doc_words, doc_grams)):
+            bucket = len(words) if len(words) <= MAX_WINDOW else LONG
+            weights = {g: (1.0 + math.log(tf)) * self.idf[g] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                postings[bucket][g].append((doc_id, w / norm))
+        self.postings: Dict[int, Dict[str, Tuple[Tuple[int, float], ...]]] = {
+            bucket: {g: tuple(p) for g, p in grams.items()} for bucket, grams in postings.items()
+        }
+
+    @classmethod
+    def from_content(cls, topic_keywords: Dict[str, List[str]], qa_pairs: Dict,
+                     knowledge_base: Dict) -> "RetrievalIndex":
+        docs: List[RetrievalDoc] = []
+        for topic, keywords in topic_keywords.items():
+            docs.append(RetrievalDoc("topic", topic, topic.replace('_', ' ')))
+            docs.extend(RetrievalDoc("topic", topic, keyword) for keyword in keywords)
+        for intent, data in qa_pairs.items():
+            if intent in EXACT_ONLY_INTENTS:
+                continue
+            docs.extend(RetrievalDoc("qa", intent, pattern) for pattern in data.get('patterns', []))
+        for key, entry in knowledge_base.items():
+            docs.append(RetrievalDoc("knowledge", key, key))
+            docs.append(RetrievalDoc("knowledge", key, entry.get('display_name', '')))
+            docs.append(RetrievalDoc("knowledge", key, entry.get('definition', '')))
+            for suggestion in entry.get('suggestions', []):
+                docs.append(RetrievalDoc("knowledge", key, suggestion.get('title', '')))
+                docs.append(RetrievalDoc("knowledge", key, suggestion.get('description', '')))
+        return cls(docs)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def search(self, text: str, threshold: float = DEFAULT_THRESHOLD) -> Optional[RetrievalHit]:
+        """Dokumen dengan kemiripan kosinus tertinggi, atau None jika di bawah `threshold`."""
+        words = tokenize(text)
+        if not words:
+            return None
+
+        # N-gram seluruh pesan dihitung sekali; n-gram sebuah jendela kata adalah
+        # potongan dari daftar ini (kata dipisah tepat satu spasi setelah tokenisasi).
+        joined = " ".join(words)
+        grams = char_ngrams(joined)
+        idfs = [self.idf.get(g, self.unknown_idf) for g in grams]
+        offsets, end = [], 0
+        for word in words:
+            offsets.append((end, end + len(word)))
+            end += len(word) + 1
+
+        windows = [(size, offsets[i][0], offsets[i + size - 1][1])
+                   for size in range(1, min(MAX_WINDOW, len(words)) + 1)
+                   for i in range(len(words) - size + 1)]
+        if len(words) > MAX_WINDOW:
+            windows.append((LONG, 0, len(joined)))
+
+        lengths, initials = self._lengths, self._initials
+        best_doc, best_score = -1, 0.0
+        for bucket, lo, hi in windows:
+            postings = self.postings.get(bucket)
+            if not postings:
+                continue
+            window_grams = grams[lo:hi]
+            if len(set(window_grams)) == len(window_grams):
+                weighted = zip(window_grams, idfs[lo:hi])
+            else:
+                counts = Counter(window_grams)
+                weighted = ((g, (1.0 + math.log(tf)) * self.idf.get(g, self.unknown_idf)) for g, tf in counts.items())
+            dots: Dict[int, float] = {}
+            norm = 0.0
+            for g, weight in weighted:
+                norm += weight * weight
+                for doc_id, doc_weight in postings.get(g, ()):
+                    dots[doc_id] = dots.get(doc_id, 0.0) + weight * doc_weight
+            if not dots:
+                continue
+            # Skor minimum yang masih bisa mengalahkan kandidat terbaik sejauh ini.
+            floor = best_score * math.sqrt(norm)
+            size = hi - lo
+            # grams[lo] adalah n-gram awal kata pertama jendela (diawali spasi).
+            initial = grams[lo] if bucket == 1 else None
+            for doc_id, dot in dots.items():
+                if dot > floor and (bucket == LONG or min(size, lengths[doc_id])
+                                    >= MIN_LENGTH_RATIO * max(size, lengths[doc_id])) \
+                        and (initial is None or initials[doc_id] == initial):
+                    best_doc, floor = doc_id, dot
+            if floor > best_score * math.sqrt(norm):
+                best_score = floor / math.sqrt(norm)
+
+        if best_doc < 0 or best_score < threshold:
+            return None
+        doc = self.docs[best_doc]
+        return RetrievalHit(doc.kind, doc.key, best_score, doc.text)
@@ -0,0 +1,249 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class ContextBackend(ABC):
+    """
+    Antarmuka penyimpanan konteks percakapan.
+
+    `session()` adalah jalur yang dipakai chatbot: konteks dimuat dan dikunci
+    selama satu request, lalu disimpan kembali saat blok selesai. `get()` hanya
+    membaca (untuk inspeksi/debug) dan tidak menjamin perubahan ikut tersimpan.
+    """
+
+    evicted_lru = 0
+    evicted_ttl = 0
+
+    @abstractmethod
+    def session(self, session_id: str) -> ContextManager[Any]:
+        ...
+
+    @abstractmethod
+    def get(self, session_id: str) -> Any:
+        ...
+
+    @abstractmethod
+    def discard(self, session_id: str) -> None:
+        ...
+
+    def evict_expired(self) -> int:
+        return 0
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class SessionStore(ContextBackend):
+    """
+    Penyimpanan konteks percakapan per sesi di memori proses, dengan batas memori.
+
+    Konteks disimpan dalam OrderedDict yang urutannya mengikuti waktu akses
+    terakhir, sehingga satu struktur melayani dua jenis eviksi:
+    - LRU: jika jumlah sesi melewati `max_sessions`, sesi paling lama dibuang.
+    - TTL: sesi yang tidak disentuh lebih dari `ttl_seconds` dibuang dari depan
+      antrean setiap kali store diakses (biaya amortisasi O(1)).
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 10000,
+                 ttl_seconds: float = 1800.0):
+        if max_sessions < 1:
+            raise ValueError("max_sessions harus minimal 1")
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()  # sid -> [context, last_seen]
+        self._lock = threading.Lock()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[Any]:
+        # Objek konteks dipakai bersama, jadi tidak ada yang perlu disimpan ulang.
+        context = self.get(session_id)
+        with context.lock:
+            yield context
+
+    def get(self, session_id: str) -> Any:
+        """Mengambil konteks untuk sesi, membuatnya jika belum ada atau sudah kedaluwarsa."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = [self._factory(), now]
+                self._sessions[session_id] = entry
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+            else:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self) -> int:
+        """Membuang semua sesi kedaluwarsa; bisa dipanggil berkala dari thread lain."""
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def _expire(self, now: float) -> int:
+        # Sesi terurut dari yang paling lama diakses, jadi cukup periksa dari depan.
+        removed = 0
+        cutoff = now - self.ttl_seconds
+        while self._sessions:
+            sid, entry = next(iter(self._sessions.items()))
+            if entry[1] >= cutoff:
+                break
+            del self._sessions[sid]
+            removed += 1
+        self.evicted_ttl += removed
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+        }
+
+
+class SQLiteSessionStore(ContextBackend):
+    """
+    Konteks percakapan di file SQLite (mode WAL) yang dipakai bersama oleh semua
+    worker di satu mesin, sehingga flow terpandu tetap berjalan walau pesan
+    berikutnya mendarat di proses lain.
+
+    `context_type` harus menyediakan `to_state()` dan `from_state(state)`;
+    state disimpan sebagai JSON ringkas. Request dari sesi yang sama diserialkan
+    dengan lock per sesi di dalam proses, dan `session()` memuat serta menyimpan
+    dalam satu transaksi `BEGIN IMMEDIATE` sehingga proses lain tidak bisa
+    menimpa perubahan di antaranya.
+    """
+
+    # Kunci dibagi ke sejumlah slot tetap agar tidak ada dict lock yang tumbuh tanpa batas.
+    LOCK_STRIPES = 256
+    # Eviksi TTL dijalankan sekali setiap sekian penyimpanan.
+    PRUNE_EVERY = 512
+
+    def __init__(self, path: str, context_type: Any, ttl_seconds: float = 1800.0):
+        self.path = path
+        self.context_type = context_type
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._locks = [threading.RLock() for _ in range(self.LOCK_STRIPES)]
+        self._saves = 0
+        self.evicted_ttl = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS contexts ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS contexts_updated ON contexts(updated)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Satu koneksi per thread; koneksi SQLite tidak boleh dipakai lintas thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lock_for(self, session_id: str) -> threading.RLock:
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % self.LOCK_STRIPES]
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[Any]:
+        with self._lock_for(session_id):
+            conn = self._connect()
+            if conn.in_transaction:
+                # Sesi bersarang di thread yang sama sudah berada di dalam transaksi.
+                context = self.get(session_id)
+                try:
+                    yield context
+                finally:
+                    self.save(session_id, context)
+                return
+            # Lock tulis diambil sebelum membaca: worker lain menunggu (busy timeout)
+            # alih-alih membaca state lama lalu menimpa hasil simpanan kita.
+            # Pemanggil hanya memegang sesi selama tahap rule-based, bukan inferensi.
+            conn.execute("BEGIN IMMEDIATE")
+            committed = False
+            try:
+                context = self.get(session_id)
+                try:
+                    yield context
+                finally:
+                    self.save(session_id, context)
+                    conn.execute("COMMIT")
+                    committed = True
+            finally:
+                if not committed:
+                    conn.execute("ROLLBACK")
+
+    def get(self, session_id: str) -> Any:
+        row = self._connect().execute(
+            "SELECT state, updated FROM contexts WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is not None and row[1] >= time.time() - self.ttl_seconds:
+            try:
+                return self.context_type.from_state(json.loads(row[0]))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"State sesi rusak, memulai konteks baru: {e}")
+        return self.context_type()
+
+    def save(self, session_id: str, context: Any) -> None:
+        state = json.dumps(context.to_state(), ensure_ascii=False, separators=(",", ":"))
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO contexts (session_id, state, updated) VALUES (?, ?, ?)",
+            (session_id, state, time.time()),
+        )
+        self._saves += 1
+        if self._saves % self.PRUNE_EVERY == 0:
+            self.evict_expired()
+
+    def discard(self, session_id: str) -> None:
+        self._connect().execute("DELETE FROM contexts WHERE session_id = ?", (session_id,))
+
+    def evict_expired(self) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM contexts WHERE updated < ?", (time.time() - self.ttl_seconds,)
+        )
+        self.evicted_ttl += cursor.rowcount
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": len(self),
+            "evicted_ttl": self.evicted_ttl,
+        }
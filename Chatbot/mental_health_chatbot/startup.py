@@ -0,0 +1,107 @@
+"""
+Profil waktu startup per komponen (import dan inisialisasi).
+
+Aktifkan dengan CHATBOT_PROFILE_STARTUP=1; laporan ditulis ke stderr begitu
+app.py selesai dimuat. Bisa juga dijalankan langsung:
+    python startup.py                 # profil `import app`
+    python startup.py --json          # laporan sebagai JSON
+    CHATBOT_MODEL_MODE=eager python startup.py
+
+Modul ini harus diimpor paling awal oleh entry point agar waktu import
+komponen berikutnya ikut tercatat.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+PROFILE_ENV = "CHATBOT_PROFILE_STARTUP"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level=logging.INFO) -> None:
+    """
+    Konfigurasi logging global, dipanggil oleh entry point (app.py, CLI). Mengimpor
+    modul chatbot tidak lagi mengubah logging proses yang memakainya.
+    """
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+class StartupProfile:
+    """Pencatat fase startup bersarang; tanpa biaya berarti jika tidak aktif."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.phases: List[Dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reported = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        depth = getattr(self._local, "depth", 0)
+        entry = {"phase": name, "depth": depth, "thread": threading.current_thread().name,
+                 "start_ms": (time.perf_counter() - self.origin) * 1000, "ms": 0.0}
+        with self._lock:
+            self.phases.append(entry)
+        self._local.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["ms"] = (time.perf_counter() - started) * 1000
+            self._local.depth = depth
+
+    def report(self) -> str:
+        total = (time.perf_counter() - self.origin) * 1000
+        lines = [f"Profil startup: {total:.1f} ms sejak startup.py diimpor"]
+        for entry in self.phases:
+            label = "  " * entry["depth"] + entry["phase"]
+            if entry["thread"] != "MainThread":
+                label += f" [{entry['thread']}]"
+            lines.append(f"  {label:<52} {entry['ms']:9.1f} ms  (mulai +{entry['start_ms']:.1f} ms)")
+        return "\n".join(lines)
+
+    def finish(self) -> None:
+        """Dipanggil entry point setelah siap melayani; mencetak laporan sekali."""
+        if self.enabled and not self._reported:
+            self._reported = True
+            print(self.report(), file=sys.stderr)
+
+
+STARTUP = StartupProfile(os.environ.get(PROFILE_ENV, "0") == "1")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mengukur waktu import dan inisialisasi worker AuraMind.")
+    parser.add_argument("--module", default="app", help="modul entry point yang diimpor (default: app)")
+    parser.add_argument("--json", action="store_true", help="cetak fase sebagai JSON ke stdout")
+    args = parser.parse_args(argv)
+
+    # Entry point mengimpor modul `startup` (bukan `__main__` ini), jadi profil yang
+    # dipakai adalah instance baru yang membaca variabel lingkungan di bawah.
+    os.environ[PROFILE_ENV] = "1"
+    started = time.perf_counter()
+    importlib.import_module(args.module)
+    elapsed = (time.perf_counter() - started) * 1000
+    profile = importlib.import_module("startup").STARTUP
+    if args.json:
+        print(json.dumps({"module": args.module, "total_ms": elapsed, "phases": profile.phases}, indent=2))
+    else:
+        profile.finish()
+    print(f"import {args.module}: {elapsed:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modul chatbot diimpor dengan nama datar (`from matcher import ...`), sama seperti app.py.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
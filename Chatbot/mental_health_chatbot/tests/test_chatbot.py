@@ -0,0 +1,159 @@
+"""
+Uji regresi untuk jalur rule-based:
+- MessageMatcher harus sama persis dengan logika regex `\\b` lama per keyword.
+- Replay flow terpandu harus sama dengan keluaran implementasi step lama
+  (fixtures/flow_replay.json, direkam sebelum flow dipindah ke data).
+- Penyaring darurat menangkap ejaan tersamar tanpa memicu kata sehari-hari.
+- Tahap retrieval menangkap salah ketik tanpa menebak kata lain yang hanya mirip.
+"""
+import json
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from chatbot import STAGE_RETRIEVAL, MentalHealthChatbot
+from emergency import EmergencyScreener
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture(scope="module")
+def bot():
+    return MentalHealthChatbot(model_mode="disabled", snapshot_cache_dir=None)
+
+
+def _regex_match(keyword: str, text_lower: str) -> bool:
+    return re.search(r'\b' + re.escape(keyword) + r'\b', text_lower) is not None
+
+
+def _regex_scan(bot, text_lower: str):
+    topic_scores = {
+        topic: sum(1 for kw in keywords if _regex_match(kw, text_lower))
+        for topic, keywords in bot.topic_keywords.items()
+    }
+    topic_scores = {topic: score for topic, score in topic_scores.items() if score > 0}
+    qa_intent = next((intent for intent, data in bot.qa_pairs.items()
+                      if any(_regex_match(p, text_lower) for p in data.get('patterns', []))), None)
+    emergency = any(_regex_match(kw, text_lower) for kw in bot.emergency_keywords)
+    return topic_scores, qa_intent, emergency
+
+
+def _matcher_corpus(bot, count: int = 3000):
+    keywords = [kw for keywords in bot.topic_keywords.values() for kw in keywords]
+    keywords += [p for data in bot.qa_pairs.values() for p in data.get('patterns', [])]
+    keywords += bot.emergency_keywords
+    fillers = ["aku", "lagi", "banget", "x", "123", "é", "_", "ku", "nya"]
+    separators = [" ", " ", "", "-", ".", ", ", "_", "é", "\n"]
+    rng = random.Random(11)
+    texts = []
+    for _ in range(count):
+        parts = [rng.choice(keywords + fillers) for _ in range(rng.randint(1, 5))]
+        text = parts[0]
+        for part in parts[1:]:
+            text += rng.choice(separators) + part
+        texts.append(text.lower())
+    return texts
+
+
+def test_matcher_matches_word_boundary_regex(bot):
+    for text in _matcher_corpus(bot):
+        result = bot.matcher.scan(text)
+        topic_scores, qa_intent, emergency = _regex_scan(bot, text)
+        assert (result.topic_scores, result.qa_intent, result.emergency) == (topic_scores, qa_intent, emergency), text
+
+
+def test_flow_replay_matches_recorded_outputs(bot):
+    recorded = json.loads((FIXTURES / "flow_replay.json").read_text(encoding="utf-8"))
+    fields = recorded["fields"]
+    rows = [dict(zip(fields, row)) for row in recorded["rows"]]
+    # Setiap percakapan: nama flow (polos, huruf besar, berspasi) lalu empat pesan lanjutan.
+    for index in range(0, len(rows), 5):
+        session_id = f"s{index:08d}"
+        for expected in rows[index:index + 5]:
+            random.seed(1)
+            result = bot.respond(expected["message"], session_id)
+            context = bot.sessions.get(session_id)
+            actual = {
+                "flow": expected["flow"],
+                "message": expected["message"],
+                "stage": result.stage,
+                "topic": result.topic,
+                "response": result.response,
+                "active_flow": context.active_flow,
+                "flow_step": context.flow_step,
+                "data": dict(context.data),
+                "history": list(context.conversation_history),
+            }
+            assert actual == expected
+
+
+@pytest.fixture(scope="module")
+def screener():
+    data = json.loads((Path(__file__).parent.parent / "data" / "emergency.json").read_text(encoding="utf-8"))
+    return EmergencyScreener.from_emergency_data(data)
+
+
+@pytest.mark.parametrize("text", [
+    "aku ingin bunuh diri",
+    "Aku ingin BUNUH DÍRI",
+    "rasanya pengen bun0h d1r1",
+    "kadang aku $elf h4rm",
+    "aku mau matiii",
+    "pikiran bunuh-diri terus muncul",
+    "b u n u h d i r i",
+    "b.u.n.u.h d.i.r.i",
+    "aku kepikiran bunug diri",
+    "thinking about sucide",
+    "aku pengen mati aja",
+    "aku ingin mengakhiri semuanya",
+    "udah gak tahan lagi",
+    "I want to die",
+    "i just want to kill myself",
+    "bundir aja kali ya",
+    "mending mati",
+])
+def test_screener_catches_disguised_emergencies(screener, text):
+    assert screener.screen(text)
+
+
+@pytest.mark.parametrize("text", [
+    "aku mau matiin lampu dulu",
+    "mau matiin laptop",
+    "ingin matiin tv",
+    "aku mau matiin alarm",
+    "jangan lupa matikan kompor",
+    "halo apa kabar",
+    "aku lagi stres sama kerjaan",
+    "diriku baik-baik saja",
+    "aku mau makan dulu",
+    "self care itu penting",
+    "aku ingin hidup sehat",
+    "",
+])
+def test_screener_ignores_everyday_messages(screener, text):
+    assert not screener.screen(text)
+
+
+@pytest.mark.parametrize("text, key", [
+    ("strees", "stres"),
+    ("aku lagi strees banget", "stres"),
+    ("overthingking terus", "overthinking"),
+    ("ocd itu apa", "ocd"),
+    ("insomia parah", "insomnia"),
+])
+def test_retrieval_catches_typos(bot, text, key):
+    result = bot.respond(text, "retrieval01")
+    assert (result.stage, result.topic) == (STAGE_RETRIEVAL, key)
+
+
+@pytest.mark.parametrize("text", [
+    "tenang",
+    "gak tenang",
+    "aku ingin tenang",
+    "gimana caranya biar tenang",
+])
+def test_retrieval_ignores_similar_real_words(bot, text):
+    assert bot.snapshot.retrieval.search(text, bot.retrieval_threshold) is None
+    assert bot.respond(text, "retrieval02").stage != STAGE_RETRIEVAL